@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from PlotGenerator.Benchmark.DomainGenerator import domain_parameters, generate_domain
+from PlotGenerator.DomainDatabase.DomainDatabase import DomainDatabase
+from PlotGenerator.QuestGenerator.GeneticAlgorithm import GeneticAlgorithm
+from PlotGenerator.QuestGenerator.PDDLFileGenerator import write_pddl_domain
+
+# Evaluation backends compared by the benchmark (keyword arguments of GeneticAlgorithm)
+backends = {
+    "strips": {"planner": "strips"},
+    "strips_filter": {"planner": "strips", "reachability_filter": True},
+    "strips_reuse": {"planner": "strips", "plan_reuse": True},
+    "strips_threads": {"planner": "strips", "num_workers": 4, "executor": "thread"},
+    "hsp": {"planner": "hsp"},
+    "hsp_async": {"planner": "hsp", "num_workers": 4, "executor": "async"},
+    "hsp_batch": {"planner": "hsp", "num_workers": 4, "batch_planning": True}
+}
+
+
+def measure(function, *args, **kwargs):
+    # Returns result of function with its wall time (seconds) and peak traced memory (bytes)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def prepare_planner_folder(dd, domain_folder, planner_folder):
+    # HSP planner folder of synthetic domain - scripts of given planner folder with PDDL of generated domain
+    domain_planner_folder = os.path.join(domain_folder, "Planner")
+    os.makedirs(domain_planner_folder, exist_ok=True)
+    for filename in ["Makefile", "RunPlanner.sh", "PROBLEMS"]:
+        shutil.copy(os.path.join(planner_folder, filename), domain_planner_folder)
+    write_pddl_domain(dd, os.path.join(domain_planner_folder, f"{dd.name}.pddl"))
+    return domain_planner_folder
+
+
+def benchmark_loading(domain_filename, repeat=5):
+    # Parsing of XML file and loading of compiled domain
+    results = {}
+    for name, compiled in [("parse", False), ("compiled", True)]:
+        DomainDatabase(domain_filename, compiled=compiled)
+        times = []
+        for _ in range(repeat):
+            dd, seconds, peak = measure(DomainDatabase, domain_filename, compiled=compiled)
+            times.append(seconds)
+        results[name] = {"seconds": min(times), "peak_memory": peak}
+    return results
+
+
+def benchmark_generation(dd, population_size, seed=0, **ga_options):
+    ga = GeneticAlgorithm(dd, population_size=population_size, seed=seed, **ga_options)
+    population, seconds, peak = measure(ga.generate_initial_population)
+    return {"seconds": seconds, "individuals_per_second": len(population) / seconds, "peak_memory": peak}
+
+
+def benchmark_evaluation(dd, population_size, backend, desired_story_arc, seed=0, **ga_options):
+    ga = GeneticAlgorithm(dd, population_size=population_size, seed=seed, **backends[backend], **ga_options)
+    population = ga.generate_initial_population()
+    evaluated_population, seconds, peak = measure(ga.evaluate_population, population, desired_story_arc)
+    ga.close()
+    return {
+        "seconds": seconds,
+        "individuals_per_second": len(population) / seconds,
+        "planner_calls": ga.planner_calls,
+        "planner_calls_per_second": ga.planner_calls / seconds,
+        "solved": sum(1 for evaluated in evaluated_population if evaluated["solution"]),
+        "peak_memory": peak
+    }
+
+
+def benchmark_ga(dd, population_size, backend, desired_story_arc, generations, num_quests, seed=0, **ga_options):
+    ga = GeneticAlgorithm(dd, population_size=population_size, seed=seed, **backends[backend], **ga_options)
+    quests_with_plans, seconds, peak = measure(ga, generations, num_quests, desired_story_arc)
+    individuals = population_size * (generations + 1) * num_quests
+    return {
+        "seconds": seconds,
+        "individuals_per_second": individuals / seconds,
+        "planner_calls": ga.planner_calls,
+        "planner_calls_per_second": ga.planner_calls / seconds,
+        "quests_with_plan": sum(1 for quest, solution in quests_with_plans if solution),
+        "peak_memory": peak
+    }
+
+
+def run_benchmarks(scales=(1, 2, 4), backend_names=("strips", "strips_filter"), population_size=100, generations=5, num_quests=1, desired_story_arc=(1, 2, 3, 2), start_size=(1, 31), goal_size=(1, 11), seed=0, folder=None, planner_folder="PlotGenerator/Planner"):
+    # Benchmark all stages on synthetic domains of given scales, returns list of result records
+    folder = folder or tempfile.mkdtemp(prefix="PlotGeneratorBenchmark_")
+    desired_story_arc = list(desired_story_arc)
+    ga_options = {"start_size": start_size, "goal_size": goal_size}
+
+    results = []
+    for scale in scales:
+        domain_folder = os.path.join(folder, f"scale{scale}")
+        os.makedirs(domain_folder, exist_ok=True)
+        domain_filename = generate_domain(os.path.join(domain_folder, "World.xml"), seed=seed, **domain_parameters(scale))
+        dd = DomainDatabase(domain_filename)
+        ga_options["planner_folder"] = prepare_planner_folder(dd, domain_folder, planner_folder)
+
+        record = {
+            "scale": scale,
+            "literals": len(dd.literal_keys),
+            "operators": len(dd.operators),
+            "loading": benchmark_loading(domain_filename),
+            "generation": benchmark_generation(dd, population_size, seed, **ga_options),
+            "evaluation": {},
+            "genetic_algorithm": {}
+        }
+        for backend in backend_names:
+            record["evaluation"][backend] = benchmark_evaluation(dd, population_size, backend, desired_story_arc, seed, **ga_options)
+            record["genetic_algorithm"][backend] = benchmark_ga(dd, population_size, backend, desired_story_arc, generations, num_quests, seed, **ga_options)
+        results.append(record)
+
+    return results
+
+
+def print_results(results):
+    print(f"{'scale':>5} {'literals':>8} {'parse ms':>9} {'load ms':>8} {'gen ind/s':>10}")
+    for record in results:
+        print(
+            f"{record['scale']:>5} {record['literals']:>8} "
+            f"{record['loading']['parse']['seconds'] * 1000:>9.2f} {record['loading']['compiled']['seconds'] * 1000:>8.2f} "
+            f"{record['generation']['individuals_per_second']:>10.0f}"
+        )
+
+    print(f"\n{'scale':>5} {'backend':>16} {'stage':>18} {'seconds':>9} {'ind/s':>9} {'calls/s':>9} {'peak MB':>8}")
+    for record in results:
+        for stage in ["evaluation", "genetic_algorithm"]:
+            for backend, result in record[stage].items():
+                print(
+                    f"{record['scale']:>5} {backend:>16} {stage:>18} {result['seconds']:>9.3f} "
+                    f"{result['individuals_per_second']:>9.0f} {result['planner_calls_per_second']:>9.0f} "
+                    f"{result['peak_memory'] / 2**20:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quest generation on synthetic domains")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backends", nargs="+", default=["strips", "strips_filter"], choices=list(backends))
+    parser.add_argument("--population-size", type=int, default=100)
+    parser.add_argument("--generations", type=int, default=5)
+    parser.add_argument("--quests", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", help="folder for generated domains (temporary folder by default)")
+    parser.add_argument("--planner-folder", default="PlotGenerator/Planner")
+    parser.add_argument("--output", help="JSON file with results")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        scales=args.scales,
+        backend_names=args.backends,
+        population_size=args.population_size,
+        generations=args.generations,
+        num_quests=args.quests,
+        seed=args.seed,
+        folder=args.folder,
+        planner_folder=args.planner_folder
+    )
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
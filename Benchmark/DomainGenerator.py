@@ -0,0 +1,150 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+def domain_parameters(scale):
+    # Counts of domain elements growing with scale (scale 1 is about the size of World.xml)
+    return {
+        "characters": 7 * scale,
+        "locations": 10 * scale,
+        "items": 10 * scale,
+        "enemies": 3 * scale,
+        "paths": 2,
+        "predicates": 4 * scale,
+        "operators": 4 * scale
+    }
+
+
+def add_parameters(element, tag, attribute, values):
+    for value in values:
+        ET.SubElement(element, tag, {attribute: value})
+
+
+def add_predicate(relations, name, *values):
+    add_parameters(ET.SubElement(relations, "predicate", {"name": name}), "parameter", "value", values)
+
+
+def add_operator(operators, name, parameters, preconditions, effects):
+    # Parameters: (name, type), preconditions and effects: (predicate, negation, parameter names)
+    operator = ET.SubElement(operators, "operator", {"name": name})
+    operator_parameters = ET.SubElement(operator, "parameters")
+    for parameter_name, parameter_type in parameters:
+        ET.SubElement(operator_parameters, "parameter", {"name": parameter_name, "type": parameter_type})
+    for tag, literals in [("precondition", preconditions), ("effect", effects)]:
+        section = ET.SubElement(operator, tag + "s")
+        for predicate, negation, params in literals:
+            attributes = {"predicate": predicate}
+            if negation:
+                attributes["negation"] = "true"
+            add_parameters(ET.SubElement(section, tag, attributes), "parameter", "name", params)
+
+
+def generate_domain(filename, characters=7, locations=10, items=10, enemies=3, paths=2, predicates=4, operators=4, seed=None):
+    # Write World.xml-compatible domain with given numbers of objects, extra paths per location,
+    # synthetic predicates (traits of characters or items) and synthetic operators changing them
+    rng = np.random.default_rng(seed)
+
+    objects = {
+        "character": [f"character{i}" for i in range(characters)],
+        "location": [f"location{i}" for i in range(locations)],
+        "item": [f"item{i}" for i in range(items)],
+        "enemy": [f"enemy{i}" for i in range(enemies)]
+    }
+    trait_types = [["character", "item"][rng.integers(2)] for _ in range(predicates)]
+
+    world = ET.Element("world")
+
+    world_objects = ET.SubElement(world, "objects")
+    for object_type, names in objects.items():
+        for name in names:
+            ET.SubElement(world_objects, "object", {"type": object_type, "name": name})
+
+    # Locations are connected in a ring (so every location is reachable) and by random extra paths
+    relations = ET.SubElement(world, "relations")
+    location_names = objects["location"]
+    edges = {(i, (i + 1) % locations) for i in range(locations) if locations > 1}
+    for i in range(locations):
+        for j in rng.choice(locations, size=min(paths, locations), replace=False):
+            if i != j:
+                edges.add((i, int(j)))
+    for i, j in sorted(edges):
+        add_predicate(relations, "path", location_names[i], location_names[j])
+        add_predicate(relations, "path", location_names[j], location_names[i])
+
+    for name in location_names:
+        add_predicate(relations, "open", name)
+        if rng.random() < 0.5:
+            add_predicate(relations, "safe", name)
+    for i, name in enumerate(objects["character"]):
+        add_predicate(relations, "alive", name)
+        add_predicate(relations, "at", name, location_names[rng.integers(locations)])
+        # One hero per seven characters
+        if i % 7 == 0:
+            add_predicate(relations, "hero", name)
+    for name in objects["item"] + objects["enemy"]:
+        add_predicate(relations, "at", name, location_names[rng.integers(locations)])
+    for k, trait_type in enumerate(trait_types):
+        for name in objects[trait_type]:
+            if rng.random() < 0.3:
+                add_predicate(relations, f"trait{k}", name)
+
+    world_predicates = ET.SubElement(world, "predicates")
+    signatures = [
+        ("at", "true", [{"type": "character", "unique": "true"}, {"type": "location"}]),
+        ("at", "true", [{"type": "item", "unique": "true"}, {"type": "location"}]),
+        ("has", "true", [{"type": "character"}, {"type": "item", "unique": "true"}]),
+        ("safe", "false", [{"type": "location"}])
+    ] + [(f"trait{k}", "true", [{"type": trait_type}]) for k, trait_type in enumerate(trait_types)]
+    for name, goalstate, parameters in signatures:
+        predicate = ET.SubElement(world_predicates, "predicate", {"name": name, "initialstate": "true", "goalstate": goalstate})
+        for parameter in parameters:
+            ET.SubElement(predicate, "parameter", parameter)
+
+    world_operators = ET.SubElement(world, "operators")
+    event_effects = {"go": "=", "get": "+", "give": "+", "kill": "+"}
+    add_operator(
+        world_operators, "go",
+        [("c", "character"), ("l1", "location"), ("l2", "location")],
+        [("at", False, ["c", "l1"]), ("alive", False, ["c"]), ("hero", False, ["c"]), ("open", False, ["l1"]), ("path", False, ["l1", "l2"])],
+        [("at", False, ["c", "l2"]), ("at", True, ["c", "l1"])]
+    )
+    add_operator(
+        world_operators, "get",
+        [("c", "character"), ("i", "item"), ("l", "location")],
+        [("at", False, ["c", "l"]), ("alive", False, ["c"]), ("hero", False, ["c"]), ("at", False, ["i", "l"]), ("safe", False, ["l"])],
+        [("has", False, ["c", "i"]), ("at", True, ["i", "l"])]
+    )
+    add_operator(
+        world_operators, "give",
+        [("c1", "character"), ("c2", "character"), ("i", "item"), ("l", "location")],
+        [("at", False, ["c1", "l"]), ("hero", False, ["c1"]), ("at", False, ["c2", "l"]), ("alive", False, ["c2"]), ("has", False, ["c1", "i"])],
+        [("has", False, ["c2", "i"]), ("has", True, ["c1", "i"])]
+    )
+    add_operator(
+        world_operators, "kill",
+        [("c", "character"), ("e", "enemy"), ("l", "location")],
+        [("at", False, ["c", "l"]), ("alive", False, ["c"]), ("hero", False, ["c"]), ("at", False, ["e", "l"])],
+        [("safe", False, ["l"])]
+    )
+
+    # Synthetic operators: hero with an item turns one trait into another
+    trait_parameter = {"character": "c", "item": "i"}
+    for k in range(operators if predicates > 1 else 0):
+        a, b = rng.choice(predicates, size=2, replace=False)
+        add_operator(
+            world_operators, f"task{k}",
+            [("c", "character"), ("i", "item")],
+            [("hero", False, ["c"]), ("alive", False, ["c"]), ("has", False, ["c", "i"]), (f"trait{a}", False, [trait_parameter[trait_types[a]]])],
+            [(f"trait{b}", False, [trait_parameter[trait_types[b]]]), (f"trait{a}", True, [trait_parameter[trait_types[a]]])]
+        )
+        event_effects[f"task{k}"] = "+-="[rng.integers(3)]
+
+    world_event_effects = ET.SubElement(world, "eventeffects")
+    for name, tension in event_effects.items():
+        ET.SubElement(world_event_effects, "event", {"name": name, "tension": tension})
+
+    tree = ET.ElementTree(world)
+    ET.indent(tree, space="    ")
+    tree.write(filename)
+    return filename
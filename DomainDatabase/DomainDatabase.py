@@ -1,16 +1,23 @@
+import hashlib
 import os
+import pickle
 import xml.etree.ElementTree as ET
 from collections import defaultdict
 
+import numpy as np
+
 tension_mapper = {
     "+": 1,
     "-": -1,
     "=": 0
 }
 
+# Version of compiled domain files, files of other versions are recompiled
+COMPILED_VERSION = 1
+
 
 class DomainDatabase:
-    def __init__(self, domain_filename, world_name=None):
+    def __init__(self, domain_filename, world_name=None, compiled=True):
         filename_no_ext = os.path.splitext(domain_filename)[0]
 
         if world_name:
@@ -18,102 +25,301 @@ class DomainDatabase:
         else:
             self.name = filename_no_ext.split("/")[-1]
 
+        # Parsed and indexed domain is stored in compiled file next to XML file and reloaded while XML is unchanged,
+        # PDDL domain generated from XML file is rewritten whenever domain is compiled
+        compiled_filename = filename_no_ext + ".domain.pickle"
+        pddl_filename = filename_no_ext + ".pddl"
+        if compiled and self.load_compiled(domain_filename, compiled_filename):
+            if not os.path.exists(pddl_filename):
+                self.write_pddl_domain(pddl_filename)
+            return
+
+        self.parse(domain_filename)
+        self.build_indexes()
+
+        if compiled:
+            self.save_compiled(domain_filename, compiled_filename)
+            self.write_pddl_domain(pddl_filename)
+
+    def parse(self, domain_filename):
         self.objects = defaultdict(list)  # objects
         self.relations = []  # relations
         self.predicates = []  # predicates
         self.operators = []  # operators
         self.event_effects = {}  # event effects
 
-        tree = ET.parse(domain_filename)
-        root = tree.getroot()
-
-        for child in root:
-
-            if child.tag == "objects":
-                for object in child:
-                    self.objects[object.attrib["type"]].append(object.attrib["name"])
-
-            if child.tag == "relations":
-                for relation in child:
-                    parameters = []
-                    for parameter in relation:
-                        parameters.append(parameter.attrib["value"])
-                    self.relations.append(self.relation_representation(relation.attrib["name"], parameters))
-
-            if child.tag == "predicates":
-                for predicate in child:
-                    parameters = []
-                    for parameter in predicate:
-                        parameters.append(parameter.attrib)
-                    self.predicates.append(
-                        self.predicate_representation(
-                            predicate.attrib.pop('name'),
-                            predicate.attrib,
-                            parameters
-                        )
+        # Identity of domain content (used to address cached plans)
+        self.identity = self.file_identity(domain_filename)
+
+        # Elements are parsed as they are streamed (sections are root children, path holds tags of open elements)
+        # and cleared afterwards, so that large world files are never held in memory at once
+        predicate_names = set()
+        path = []
+        for event, element in ET.iterparse(domain_filename, events=("start", "end")):
+            if event == "start":
+                path.append(element.tag)
+                continue
+            path.pop()
+            if len(path) != 2:
+                continue
+            section = path[1]
+
+            if section == "objects":
+                object = element
+                self.objects[object.attrib["type"]].append(object.attrib["name"])
+
+            if section == "relations":
+                relation = element
+                parameters = []
+                for parameter in relation:
+                    parameters.append(parameter.attrib["value"])
+                self.relations.append(self.relation_representation(relation.attrib["name"], parameters))
+
+            if section == "predicates":
+                predicate = element
+                parameters = []
+                for parameter in predicate:
+                    parameters.append(dict(parameter.attrib))
+                attributes = dict(predicate.attrib)
+                self.predicates.append(
+                    self.predicate_representation(
+                        attributes.pop('name'),
+                        attributes,
+                        parameters
                     )
+                )
+                predicate_names.add(self.predicates[-1]['name'])
+
+            if section == "operators":
+                operator = element
+
+                parameters = {}
+                for parameter in operator.find('parameters'):
+                    parameters[parameter.attrib['name']] = parameter.attrib['type']
 
-            if child.tag == "operators":
-                for operator in child:
-
-                    parameters = {}
-                    for parameter in operator.find('parameters'):
-                        parameters[parameter.attrib['name']] = parameter.attrib['type']
-
-                    preconditions = []
-                    for precondition in operator.find('preconditions'):
-                        params = [param.attrib['name'] for param in precondition]
-
-                        negation = None
-                        try:
-                            if precondition.attrib['negation'] == 'true':
-                                negation = 'not'
-                        except KeyError:
-                            pass
-
-                        p = (precondition.attrib['predicate'],
-                             negation,
-                             params)
-                        preconditions.append(p)
-
-                    effects = []
-                    for effect in operator.find('effects'):
-                        params = [param.attrib['name'] for param in effect]
-
-                        negation = None
-                        try:
-                            if effect.attrib['negation'] == 'true':
-                                negation = 'not'
-                        except KeyError:
-                            pass
-
-                        e = (effect.attrib['predicate'],
-                             negation,
-                             params)
-                        effects.append(e)
-
-                        if effect.attrib['predicate'] not in [p['name'] for p in self.predicates]:
-                            self.relations.append(self.relation_representation(effect.attrib['predicate'],
-                                                                                 params))
-
-                    self.operators.append(
-                        self.operator_representation(
-                            operator.attrib['name'],
-                            parameters,
-                            preconditions,
-                            effects
-                        )
+                preconditions = []
+                for precondition in operator.find('preconditions'):
+                    params = [param.attrib['name'] for param in precondition]
+
+                    negation = None
+                    try:
+                        if precondition.attrib['negation'] == 'true':
+                            negation = 'not'
+                    except KeyError:
+                        pass
+
+                    p = (precondition.attrib['predicate'],
+                         negation,
+                         params)
+                    preconditions.append(p)
+
+                effects = []
+                for effect in operator.find('effects'):
+                    params = [param.attrib['name'] for param in effect]
+
+                    negation = None
+                    try:
+                        if effect.attrib['negation'] == 'true':
+                            negation = 'not'
+                    except KeyError:
+                        pass
+
+                    e = (effect.attrib['predicate'],
+                         negation,
+                         params)
+                    effects.append(e)
+
+                    if effect.attrib['predicate'] not in predicate_names:
+                        self.relations.append(self.relation_representation(effect.attrib['predicate'],
+                                                                             params))
+
+                self.operators.append(
+                    self.operator_representation(
+                        operator.attrib['name'],
+                        parameters,
+                        preconditions,
+                        effects
                     )
+                )
+
+            if section == "eventeffects":
+                eventeffect = element
+                self.event_effects[eventeffect.attrib["name"]] = tension_mapper[eventeffect.attrib["tension"]]
+
+            element.clear()
+
+    def build_indexes(self):
+        # Action ids and tension effect of each action as lookup array
+        self.action_ids = {name: i for i, name in enumerate(self.event_effects)}
+        self.event_effects_array = np.array(list(self.event_effects.values()), dtype=int)
+
+        # Symbol table of literals (objects and ground relations), individuals are tuples of literal ids
+        #  literal keys: ("object", type, name) or ("relation", name, values)
+        self.literal_ids = {}  # literal key -> literal id
+        self.literal_keys = []  # literal id -> literal key
+        self.literal_objects = []  # literal id -> ids of objects the literal refers to
+        self.object_ids = {}  # object name -> literal id
 
-            if child.tag == "eventeffects":
-                for eventeffect in child:
-                    self.event_effects[eventeffect.attrib["name"]] = tension_mapper[eventeffect.attrib["tension"]]
+        for object_type, names in self.objects.items():
+            for name in names:
+                self.object_id(object_type, name)
+
+        # Ground relations of the domain (relations added from operator effects have parameters instead of objects)
+        self.relation_ids = [
+            self.relation_id(relation["name"], relation["values"])
+            for relation in self.relations
+            if all(value in self.object_ids for value in relation["values"])
+        ]
+
+        # Indexes for fast generation of individuals
+        self.relations_by_object = defaultdict(list)  # object literal id -> ids of ground relations of the object
+        for relation in self.relation_ids:
+            for object in self.literal_objects[relation]:
+                self.relations_by_object[object].append(relation)
+
+        self.predicates_by_name = defaultdict(list)  # predicate name -> predicates (name can have several signatures)
+        self.predicates_by_signature = defaultdict(list)  # parameter types -> indexes of predicates
+        self.goal_predicates_by_signature = defaultdict(list)  # same for predicates allowed in goal state
+        self.opposite_predicates = {}  # predicate name -> name of its opposite predicate
+        for i, predicate in enumerate(self.predicates):
+            signature = frozenset(parameter["type"] for parameter in predicate["parameters"])
+            self.predicates_by_name[predicate["name"]].append(predicate)
+            self.predicates_by_signature[signature].append(i)
+            if predicate["attributes"].get("goalstate") == "true":
+                self.goal_predicates_by_signature[signature].append(i)
+            if "oposite" in predicate["attributes"]:
+                self.opposite_predicates[predicate["name"]] = predicate["attributes"]["oposite"]
 
         # print(self.objects)
         # print(self.relations)
         # print(self.predicates)
         # print(self.event_effects)
 
+    def file_identity(self, domain_filename):
+        with open(domain_filename, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def load_compiled(self, domain_filename, compiled_filename):
+        # Load compiled domain if it was compiled from current content of XML file
+        #  file is trusted while XML file has the same modification time and size, otherwise its hash is compared
+        try:
+            with open(compiled_filename, 'rb') as f:
+                compiled = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return False
+        if not isinstance(compiled, dict) or compiled.get("version") != COMPILED_VERSION:
+            return False
+
+        stat = os.stat(domain_filename)
+        if compiled["stamp"] != (stat.st_mtime_ns, stat.st_size):
+            if compiled["state"]["identity"] != self.file_identity(domain_filename):
+                return False
+            # Same content with new modification time, stamp is refreshed
+            self.__dict__.update(compiled["state"])
+            self.save_compiled(domain_filename, compiled_filename)
+            return True
+
+        self.__dict__.update(compiled["state"])
+        return True
+
+    def save_compiled(self, domain_filename, compiled_filename):
+        # Written to temporary file and renamed, so that concurrent loaders never see partial file
+        stat = os.stat(domain_filename)
+        state = {name: value for name, value in self.__dict__.items() if name != "name"}
+        temporary_filename = f"{compiled_filename}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_filename, 'wb') as f:
+                pickle.dump(
+                    {"version": COMPILED_VERSION, "stamp": (stat.st_mtime_ns, stat.st_size), "state": state},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(temporary_filename, compiled_filename)
+        except OSError:
+            # Domain can still be used when its folder is read-only
+            pass
+
+    def write_pddl_domain(self, pddl_filename):
+        # Imported here because PDDL file generator depends on domain database
+        from PlotGenerator.QuestGenerator.PDDLFileGenerator import write_pddl_domain
+        try:
+            write_pddl_domain(self, pddl_filename)
+        except OSError:
+            pass
+
+    def intern_literal(self, key, objects):
+        if key not in self.literal_ids:
+            self.literal_ids[key] = len(self.literal_keys)
+            self.literal_keys.append(key)
+            self.literal_objects.append(objects)
+        return self.literal_ids[key]
+
+    def object_id(self, type, name):
+        if name not in self.object_ids:
+            literal_id = len(self.literal_keys)
+            self.object_ids[name] = self.intern_literal(("object", type, name), frozenset([literal_id]))
+        return self.object_ids[name]
+
+    def relation_id(self, name, values):
+        key = ("relation", name, tuple(values))
+        if key in self.literal_ids:
+            return self.literal_ids[key]
+        return self.intern_literal(key, frozenset(self.object_ids[value] for value in values))
+
+    def is_object(self, literal_id):
+        return self.literal_keys[literal_id][0] == "object"
+
+    def literal_id(self, literal):
+        # Dict representation -> literal id
+        if "type" in literal:
+            return self.object_id(literal["type"], literal["name"])
+        return self.relation_id(literal["name"], literal["values"])
+
+    def literal(self, literal_id):
+        # Literal id -> dict representation
+        key = self.literal_keys[literal_id]
+        if key[0] == "object":
+            return self.object_representation(key[1], key[2])
+        return self.relation_representation(key[1], list(key[2]))
+
+    def individual_to_dicts(self, individual):
+        return [[self.literal(literal_id) for literal_id in literals] for literals in individual]
+
+    def individual_from_dicts(self, individual):
+        return tuple(tuple(self.literal_id(literal) for literal in literals) for literals in individual)
+
+    def individual_to_keys(self, individual):
+        # Literal keys don't depend on interning order, so they can be sent to other processes
+        return tuple(tuple(self.literal_keys[literal_id] for literal_id in literals) for literals in individual)
+
+    def individual_from_keys(self, individual):
+        return tuple(
+            tuple(
+                self.object_id(key[1], key[2]) if key[0] == "object" else self.relation_id(key[1], key[2])
+                for key in keys
+            )
+            for keys in individual
+        )
+
+    def relations_for_objects(self, object_ids):
+        # Ground relations whose objects are all among given objects
+        counts = defaultdict(int)
+        for object in object_ids:
+            for relation in self.relations_by_object[object]:
+                counts[relation] += 1
+        return sorted(relation for relation, count in counts.items() if count == len(self.literal_objects[relation]))
+
+    def predicates_for_types(self, types, goalstate=False, required_type=None):
+        # Predicates whose parameters can be filled with objects of given types
+        signatures = self.goal_predicates_by_signature if goalstate else self.predicates_by_signature
+        indexes = [
+            i
+            for signature, signature_indexes in signatures.items()
+            if signature <= types and (required_type is None or required_type in signature)
+            for i in signature_indexes
+        ]
+        return [self.predicates[i] for i in sorted(indexes)]
+
     def object_representation(self, type, name):
         return {"type": type, "name": name}
 
@@ -1,4 +1,6 @@
 export HSPHOME=/Users/VMAY9JU/PycharmProjects/PlotGenerator/hsp-planners/hsp-1.12/
-cd /Users/VMAY9JU/PycharmProjects/PlotGenerator/PlotGenerator/Planner/
-make compile
-make solve
+# Planner folder can be given as first argument (e.g. scratch folder of a parallel worker)
+cd "${1:-/Users/VMAY9JU/PycharmProjects/PlotGenerator/PlotGenerator/Planner/}" || exit 1
+# Stage can be given as second argument ("compile" or "solve"), by default both are run
+if [ "${2:-all}" != "solve" ]; then make compile; fi
+if [ "${2:-all}" != "compile" ]; then make solve; fi
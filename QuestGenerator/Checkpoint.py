@@ -0,0 +1,30 @@
+import gzip
+import os
+import pickle
+
+# Version of checkpoint files, files of other versions can't be resumed
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(filename, state):
+    # Gzipped pickle written to temporary file and renamed, so that an interrupted save never corrupts last checkpoint
+    temporary_filename = f"{filename}.{os.getpid()}.tmp"
+    with gzip.open(temporary_filename, 'wb', compresslevel=1) as f:
+        pickle.dump({"version": CHECKPOINT_VERSION, "state": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_filename, filename)
+
+
+def load_checkpoint(filename):
+    # Returns saved state or None if there is no checkpoint
+    if not os.path.exists(filename):
+        return None
+    with gzip.open(filename, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {filename}")
+    return checkpoint["state"]
+
+
+def remove_checkpoint(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
@@ -1,183 +1,621 @@
+import contextlib
+import functools
+import glob
 import itertools
 import os
+import shutil
+import tempfile
+import threading
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import re
 
 import numpy as np
 import subprocess
 from tqdm import tqdm
 
+from PlotGenerator.QuestGenerator.Checkpoint import load_checkpoint, remove_checkpoint, save_checkpoint
+from PlotGenerator.QuestGenerator.Individual import Individual, canonical_key, splice
+from PlotGenerator.QuestGenerator.PlannerRunner import AsyncPlannerRunner, PlannerBudgetExceeded
+from PlotGenerator.QuestGenerator.StripsPlanner import StripsPlanner
+
+# Genetic algorithm instance of a planning worker process (set by pool initializer)
+_worker_genetic_algorithm = None
+
+
+def _init_planning_worker(genetic_algorithm):
+    global _worker_genetic_algorithm
+    # Forked workers inherit profiler of main process instead of its pickled worker copy
+    if genetic_algorithm.profiler is not None:
+        genetic_algorithm.profiler = genetic_algorithm.profiler.worker_copy()
+    _worker_genetic_algorithm = genetic_algorithm
+
+
+def _plan_in_worker(individual_keys):
+    # Individuals are sent as literal keys because literal ids are interned separately in each process
+    individual = _worker_genetic_algorithm.dd.individual_from_keys(individual_keys)
+    return _worker_genetic_algorithm.perform_worker_planning(individual), _worker_profiler_events()
+
+
+def _plan_batch_in_worker(individuals_keys):
+    individuals = [_worker_genetic_algorithm.dd.individual_from_keys(individual_keys) for individual_keys in individuals_keys]
+    return _worker_genetic_algorithm.perform_worker_batch_planning(individuals), _worker_profiler_events()
+
+
+def _worker_profiler_events():
+    # Phases timed in planning worker are returned with its solutions and merged by main process
+    profiler = _worker_genetic_algorithm.profiler
+    return profiler.pop_worker_events() if profiler is not None else []
+
+
+def _run_quest_in_worker(genetic_algorithm, seed, generations, desired_story_arc):
+    # Independent quest run in a separate process
+    genetic_algorithm.prepare_subprocess_run(seed)
+    quest, solution = genetic_algorithm.run_quest(generations, desired_story_arc)
+    # Scratch folders are removed by main process when all quests are done
+    genetic_algorithm.close(remove_folders=False)
+    return genetic_algorithm.dd.individual_to_dicts(quest), solution
+
+
+# Translation table removing parentheses from lines of plans
+remove_parentheses = str.maketrans("", "", "()")
+
+
+@functools.lru_cache(maxsize=None)
+def rescale_indexes(length, story_arc_scaling_factor):
+    # Indexes of story arc of given length rescaled to length of scaling_factor
+    # (index generated in range (1, story_arc_scaling_factor) as in the paper and lowered by 1 to match list indexing)
+    i = np.arange(1, story_arc_scaling_factor + 1)
+    return np.ceil((i-1)/story_arc_scaling_factor*(length-1)).astype(int)
+
 
 class GeneticAlgorithm:
-    def __init__(self, domain_database, population_size=100, mutation_prob=0.2, elitism_factor=0.2, start_size=(1, 31), goal_size=(1, 11), planner_folder="PlotGenerator/Planner"):
+    def __init__(self, domain_database, population_size=100, mutation_prob=0.2, elitism_factor=0.2, start_size=(1, 31), goal_size=(1, 11), planner_folder="PlotGenerator/Planner", num_workers=1, executor="process", plan_cache=None, planner="hsp", batch_planning=False, reachability_filter=False, seed=None, planner_timeout=None, planner_memory_limit=None, plan_reuse=False, surrogate=None, surrogate_fraction=0.5, surrogate_exploration=0.1, surrogate_fill="predicted", run_controller=None, scratch_root=None, profiler=None, checkpoint_filename=None, checkpoint_interval=1, max_plan_length=None):
         self.population_size = population_size
         self.start_size = start_size
         self.goal_size = goal_size
         self.mutation_prob = mutation_prob
         self.elitism_factor = elitism_factor
         self.planner_folder = planner_folder
+        # Plan in worker scratch folders even without planning workers (set in processes running own quests)
+        self.private_folders = False
+        # Scratch folders of workers are created in a private folder under scratch_root (e.g. tmpfs /dev/shm)
+        # instead of planner folder, so that problem and planner files never touch the disk
+        self.scratch_folder = tempfile.mkdtemp(prefix="PlotGenerator_", dir=scratch_root) if scratch_root else planner_folder
+        # Single random generator makes runs reproducible from seed
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # Number of parallel planner evaluations and pool type ("process", "thread" or "async")
+        self.num_workers = num_workers
+        self.executor = executor
+        self._executor = None
+        # Optional PlanCache shared by all evaluations
+        self.plan_cache = plan_cache
 
         self.dd = domain_database
 
+        # Planner backend: "hsp" (RunPlanner.sh subprocess) or "strips" (in-process planner grounded once here)
+        self.planner = planner
+        if planner not in ["hsp", "strips"]:
+            raise ValueError(f"Unknown planner: {planner}")
+        # Skip planning of individuals whose goals are unreachable in delete-relaxed domain
+        self.reachability_filter = reachability_filter
+        self.planner_calls_avoided = 0
+        self.planner_calls = 0
+        # Reuse plans of parents that are still valid for their children instead of planning
+        self.plan_reuse = plan_reuse
+        self.plans_reused = 0
+        # Plans longer than max_plan_length actions are treated as no plan (fitness 0),
+        # in-process planner doesn't search beyond it and planner output is read only up to it
+        self.max_plan_length = max_plan_length
+        # Reachability filter and plan reuse check plots with semantics of the planner (HSP domain has no inequality)
+        if planner == "strips" or reachability_filter or plan_reuse:
+            self.strips_planner = StripsPlanner(domain_database, timeout=planner_timeout, max_plan_length=max_plan_length, inequality=planner == "strips")
+        # Solve all individuals of a generation (one batch per worker) with a single HSP invocation
+        self.batch_planning = batch_planning
+        # Per-problem wall-clock (seconds) and memory (bytes) budget of HSP solve stage (also enforced without asyncio)
+        self.planner_runner = AsyncPlannerRunner(self, num_workers, planner_timeout, planner_memory_limit)
+
+        # Optional SurrogateModel: only surrogate_fraction of offspring with best predicted fitness
+        #  (part surrogate_exploration of them chosen at random) is planned, the rest gets predicted or zero fitness
+        self.surrogate = surrogate
+        self.surrogate_fraction = surrogate_fraction
+        self.surrogate_exploration = surrogate_exploration
+        self.surrogate_fill = surrogate_fill
+
+        # Optional RunController: early stopping, per-quest budgets and population resizing
+        self.run_controller = run_controller
+
+        # Optional Profiler: timers of GA phases and planner counters per generation
+        self.profiler = profiler
+
+        # Progress of generate_quests is checkpointed to checkpoint_filename every checkpoint_interval generations
+        # and after every quest, interrupted run with the same arguments resumes from it
+        self.checkpoint_filename = checkpoint_filename
+        self.checkpoint_interval = checkpoint_interval
+        self.quest_run = None
+
+        # Planner statistics of every evaluated generation
+        self.generation_stats = []
+
+    def prepare_subprocess_run(self, seed):
+        # Setup of a copy running in its own process next to other runs (quest worker or island)
+        #  with its own random generator, planning in its own scratch folders and without profiling
+        #  (profile of main process has no phases of such runs)
+        self.rng = np.random.default_rng(seed)
+        self.private_folders = True
+        self.profiler = None
+
+    def __getstate__(self):
+        # Pools and plan cache can't be sent to worker processes (they are only used by main process),
+        # profiler is sent as worker copy collecting timed phases (see Profiler)
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["plan_cache"] = None
+        # Progress of quest run is checkpointed only by main process
+        state["quest_run"] = None
+        return state
+
     def generate_random_individual(self):
-        # Choose how many objects to start with
-        objects_start_size = np.random.randint(self.start_size[0], self.start_size[1])
+        return self.generate_random_individuals(1)[0]
 
-        # Choose how many objects of different types to choose
-        object_types_start_size = np.random.default_rng().multinomial(objects_start_size, [1 / len(self.dd.objects)] * len(self.dd.objects), size=1)[0]
+    def generate_random_individuals(self, size):
+        with self.phase("generation"):
+            # All random numbers for the batch are drawn at once, individuals are only assembled one by one
+            object_types = list(self.dd.objects.keys())
 
-        # Choose how many relations to start with
-        max_relations_start_size = self.start_size[1]-objects_start_size if self.start_size[1]-objects_start_size > self.start_size[0] + 1 else self.start_size[0] + 1
-        relations_start_size = np.random.randint(self.start_size[0], max_relations_start_size)
+            # Choose how many objects to start with
+            objects_start_sizes = self.rng.integers(self.start_size[0], self.start_size[1], size=size)
 
-        # Choose how many relations to end with
-        goal_size = np.random.randint(self.goal_size[0], self.goal_size[1])
+            # Choose how many objects of different types to choose
+            object_types_start_sizes = self.rng.multinomial(objects_start_sizes, [1 / len(object_types)] * len(object_types))
 
-        # Choose objects of the plot
-        objects = {
-            object_type: np.random.choice(self.dd.objects[object_type], object_type_size, replace=False)
-            if object_type_size <= len(self.dd.objects[object_type]) else self.dd.objects[object_type]
-            for object_type, object_type_size in zip(self.dd.objects.keys(), object_types_start_size)
-        }
-        all_objects = list(np.concatenate(list(objects.values())))
+            # Choose how many relations to start with
+            max_relations_start_sizes = np.where(
+                self.start_size[1] - objects_start_sizes > self.start_size[0] + 1,
+                self.start_size[1] - objects_start_sizes,
+                self.start_size[0] + 1
+            )
+            relations_start_sizes = self.rng.integers(self.start_size[0], max_relations_start_sizes)
+
+            # Choose how many relations to end with
+            goal_sizes = self.rng.integers(self.goal_size[0], self.goal_size[1], size=size)
+
+            # Random orders of objects of each type (sampling without replacement)
+            object_orders = {
+                object_type: np.argsort(self.rng.random((size, len(self.dd.objects[object_type]))), axis=1)
+                for object_type in object_types
+            }
+            # Random keys of goal predicates and their parameters
+            #  (keys of relations are drawn per individual, only for relations valid for its objects)
+            max_goal_size = max(self.goal_size[1], len(self.dd.predicates))
+            max_parameters = max([len(predicate["parameters"]) for predicate in self.dd.predicates], default=0)
+            goal_keys = self.rng.random((size, max_goal_size))
+            parameter_keys = self.rng.random((size, max_goal_size, max_parameters))
+
+            individuals = []
+            for i in range(size):
+                # Choose objects of the plot
+                objects = {
+                    object_type: [self.dd.objects[object_type][j] for j in object_orders[object_type][i, :object_type_size]]
+                    for object_type, object_type_size in zip(object_types, object_types_start_sizes[i])
+                }
+                object_ids = frozenset(self.dd.object_ids[object] for objects_ in objects.values() for object in objects_)
+
+                # Filter valid relations for objects of the plot
+                relations = self.dd.relations_for_objects(object_ids)
+
+                # Choose start relations of the plot
+                if relations_start_sizes[i] <= len(relations):
+                    relation_keys = self.rng.random(len(relations))
+                    start_relations = [relations[j] for j in np.argsort(relation_keys)[:relations_start_sizes[i]]]
+                else:
+                    start_relations = relations
+
+                # Filter valid predicates for objects of the plot
+                object_types_present = frozenset(object_type for object_type, objects_ in objects.items() if objects_)
+                predicates = self.dd.predicates_for_types(object_types_present, goalstate=True, required_type="character")
+
+                # Choose goal relations of the plot
+                if goal_sizes[i] <= len(predicates):
+                    goal_predicates = [predicates[int(key * len(predicates))] for key in goal_keys[i, :goal_sizes[i]]]
+                else:
+                    goal_predicates = predicates
+                goal_relations = [
+                    self.dd.relation_id(
+                        predicate["name"],
+                        [
+                            objects[parameter["type"]][int(parameter_keys[i, k, j] * len(objects[parameter["type"]]))]
+                            for j, parameter in enumerate(predicate["parameters"])
+                        ]
+                    )
+                    for k, predicate in enumerate(goal_predicates)
+                ]
+                # Remove opposite relations for the same objects
+                for relation in goal_relations:
+                    opposite_relation_name = self.dd.opposite_predicates.get(self.dd.literal_keys[relation][1])
+                    if opposite_relation_name:
+                        opposite_relation = self.dd.relation_id(opposite_relation_name, self.dd.literal_keys[relation][2])
+                        if opposite_relation in goal_relations:
+                            goal_relations.remove(opposite_relation)
+
+                objects = [self.dd.object_ids[object] for objects_ in objects.values() for object in objects_]
+
+                individuals.append(Individual(tuple(objects + start_relations), tuple(goal_relations)))
+
+            return individuals
+
+    def phase(self, name):
+        # Timer of GA phase (does nothing without profiler)
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
 
-        # Filter valid relations for objects of the plot
-        relations = [relation for relation in self.dd.relations if set(relation["values"]).issubset(all_objects)]
+    def generate_initial_population(self):
+        return self.generate_random_individuals(self.population_size)
 
-        # Choose start relations of the plot
-        start_relations = list(np.random.choice(relations, relations_start_size, replace=False)) if relations_start_size <= len(relations) else relations
+    def is_plannable(self, individual):
+        # Relaxed reachability check run before planner, counts avoided planner calls
+        if self.reachability_filter and not self.strips_planner.is_goal_reachable(individual):
+            self.planner_calls_avoided += 1
+            return False
+        return True
 
-        # Filter valid predicates for objects of the plot
-        predicates = [
-            predicate
-            for predicate in self.dd.predicates
-            if np.all([len(objects[parameter["type"]]) for parameter in predicate["parameters"]])
-               and predicate["attributes"]["goalstate"] == "true"
-               and np.any([parameter["type"] == "character" for parameter in predicate["parameters"]])
-        ]
-        # Choose goal relations of the plot
-        goal_predicates = list(np.random.choice(predicates, goal_size)) if goal_size <= len(predicates) else predicates
-        goal_relations = [
-            self.dd.relation_representation(predicate["name"], [np.random.choice(objects[parameter["type"]]) for parameter in predicate["parameters"]])
-            for predicate in goal_predicates
-        ]
-        # Remove opposite relations for the same objects
-        for relation in goal_relations:
-            opposite_relation_name = [
-                predicate["attributes"]["oposite"]
-                for predicate in predicates
-                if predicate["name"] == relation["name"] and "oposite" in predicate["attributes"]
-            ]
-            if opposite_relation_name:
-                opposite_relation = self.dd.relation_representation(opposite_relation_name[0], relation["values"])
-                if opposite_relation in goal_relations:
-                    goal_relations.remove(opposite_relation)
+    def perform_planning(self, individual):
+        # Unsolvable individuals have empty plan
+        if not self.is_plannable(individual):
+            return []
 
-        objects = [self.dd.object_representation(object_type, object) for object_type, objects_ in objects.items() for object in objects_]
+        # Use cached plan if the same individual was already planned
+        if self.plan_cache is None:
+            return self.run_planner(individual)
 
-        individual = [objects + start_relations, goal_relations]
+        key = self.plan_cache.key(individual, self.dd, self.planner_settings())
+        solution = self.plan_cache.get(key)
+        if solution is None:
+            solution = self.run_planner(individual)
+            if self.is_cacheable(solution):
+                self.plan_cache.put(key, solution)
 
-        return individual
+        return solution
 
-    def generate_initial_population(self):
-        population = []
-        for i in range(self.population_size):
-            individual = self.generate_random_individual()
-            population.append(individual)
-        return population
+    def run_planner(self, individual, planner_folder=None, name="Individual"):
+        if self.planner == "strips":
+            with self.phase("planner_search"):
+                return self.strips_planner.solve(individual)
+
+        # Plan in shared planner folder unless a worker folder is given or private folders are used
+        if planner_folder is None and self.private_folders:
+            planner_folder, name = self.get_worker_folder()
+        planner_folder = planner_folder or self.planner_folder
 
-    def perform_planning(self, individual):
         # Convert individual to PDDL format and save to file
-        self.convert_individual_to_pddl_format(individual)
+        problem_filename = self.convert_individual_to_pddl_format(individual, name=name, planner_folder=planner_folder)
+        if planner_folder != self.planner_folder:
+            self.write_problems_file(planner_folder, [name])
 
         # Run HSP planner
-        subprocess.call(['sh', 'PlotGenerator/Planner/RunPlanner.sh'])
+        finished = self.run_planner_script(planner_folder)
 
         # Remove file with individual
-        os.remove(os.path.join(self.planner_folder, "Individual.pddl"))
-
-        # Read solution from file
-        with open('PlotGenerator/Planner/solutions.all', 'r') as file:
-            solution = file.readlines()
+        os.remove(problem_filename)
+
+        if not finished:
+            self.planner_runner.timeouts += 1
+            self.remove_solution(planner_folder)
+            return PlannerBudgetExceeded()
+        return self.read_solution(planner_folder, self.max_plan_length)
+
+    def planner_settings(self):
+        # Planner backend and its settings which change plans (part of plan cache keys)
+        settings = {"planner": self.planner, "max_plan_length": self.max_plan_length}
+        if self.planner == "strips":
+            settings["inequality"] = self.strips_planner.inequality
+            settings["max_expansions"] = self.strips_planner.max_expansions
+        return settings
+
+    def run_planner_script(self, planner_folder, problems=1):
+        # Compile and solve stages of the planner are run separately when timed by profiler or limited by budget
+        #  (budget only applies to solve stage and grows with number of problems),
+        #  returns False if planner was killed over its time budget
+        runner = self.planner_runner
+        if self.profiler is None and not runner.limited:
+            subprocess.call(runner.command(planner_folder))
+            return True
+        with self.phase("planner_compile"):
+            subprocess.call(runner.command(planner_folder, "compile"))
+        with self.phase("planner_solve"):
+            return runner.run_solve_stage(planner_folder, problems)
+
+    def remove_solution(self, planner_folder):
+        # Partial solution of killed planner
+        if os.path.exists(os.path.join(planner_folder, "solutions.all")):
+            os.remove(os.path.join(planner_folder, "solutions.all"))
+
+    def is_cacheable(self, solution):
+        # Plans of planners stopped over budget are not cached
+        return not isinstance(solution, PlannerBudgetExceeded)
+
+    def read_solution(self, planner_folder, max_actions=None):
+        # Read solution from file line by line, plan with more than max_actions actions is dropped without reading the rest
+        solution = []
+        actions = 0
+        with self.phase("solution_reading"):
+            with open(os.path.join(planner_folder, "solutions.all"), 'r') as file:
+                for line in file:
+                    if line.lstrip().startswith("("):
+                        actions += 1
+                        if max_actions is not None and actions > max_actions:
+                            solution = []
+                            break
+                    solution.append(line)
 
         # Remove file with solution
-        os.remove(os.path.join(self.planner_folder, "solutions.all"))
+        os.remove(os.path.join(planner_folder, "solutions.all"))
 
         return solution
 
-    def convert_individual_to_pddl_format(self, individual, name="Individual"):
-        # returns the resulting pddl filename
-        filename = os.path.join(self.planner_folder, name + '.pddl')
-
-        with open(filename, 'w') as f:
-            f.write(f"(define (problem {name})")
-            f.write(f"\n\t(:domain {self.dd.name})")
+    def run_planner_batch(self, individuals, planner_folder, name):
+        # Solve several individuals with one compile and one solve pass of the planner
+        names = [f"{name}_{i}" for i in range(len(individuals))]
+        problem_filenames = self.write_problems(individuals, names, planner_folder)
 
-        # objects
-        objects = [p for p in individual[0] if 'type' in p.keys()]
-
-        with open(filename, 'a') as f:
-            f.write("\n\t(:objects")
+        # Run HSP planner
+        finished = self.run_planner_script(planner_folder, len(names))
 
-            for o in objects:
-                f.write(f"\n\t\t{o['name']}")
+        # Remove files with individuals
+        for problem_filename in problem_filenames:
+            os.remove(problem_filename)
 
-            f.write("\n\t)")
+        if finished:
+            return self.split_solutions(self.read_solution(planner_folder), names)
+        if not os.path.exists(os.path.join(planner_folder, "solutions.all")):
+            solutions = [[] for _ in names]
+        else:
+            solutions = self.split_solutions(self.read_solution(planner_folder), names)
+        # Plans found before the planner was killed are kept, other problems are over budget
+        solutions = [
+            solution if any(line.lstrip().startswith("(") for line in solution) else PlannerBudgetExceeded()
+            for solution in solutions
+        ]
+        self.planner_runner.timeouts += sum(1 for solution in solutions if isinstance(solution, PlannerBudgetExceeded))
+        return solutions
 
-        # preconditions
-        preconditions = [p for p in individual[0] if 'values' in p.keys()]
+    def split_solutions(self, solution, names):
+        # Split solutions of several problems into per-problem solutions
+        #  lines belong to the problem whose name appeared last in a non-action line
+        name_patterns = [re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE) for name in names]
+        solutions = [[] for _ in names]
+        current = 0 if len(names) == 1 else None
 
-        with open(filename, 'a') as f:
-            f.write("\n\t(:init")
+        for line in solution:
+            if not line.strip().startswith("("):
+                matching = [i for i, pattern in enumerate(name_patterns) if pattern.search(line)]
+                if matching:
+                    current = matching[0]
+            if current is not None:
+                solutions[current].append(line)
+
+        return solutions
+
+    def write_problems_file(self, planner_folder, names):
+        # List of problems compiled and solved by the planner Makefile
+        with open(os.path.join(planner_folder, "PROBLEMS"), 'w') as f:
+            f.write("".join(f"{name}.pddl {self.dd.name}.pddl\n" for name in names))
+
+    def get_worker_folder(self):
+        # Every worker thread/process plans in its own scratch folder under its own problem names
+        worker_name = f"worker_{os.getpid()}_{threading.get_ident()}"
+        return self.prepare_planner_folder(worker_name), worker_name
+
+    def prepare_planner_folder(self, name):
+        # Scratch folder with copies of domain and Makefile (copied only once per run)
+        planner_folder = os.path.join(self.scratch_folder, name)
+
+        if not os.path.isdir(planner_folder):
+            os.makedirs(planner_folder)
+            for filename in ["Makefile", f"{self.dd.name}.pddl"]:
+                shutil.copy(os.path.join(self.planner_folder, filename), planner_folder)
+
+        return planner_folder
+
+    def perform_worker_planning(self, individual):
+        # In-process planner needs no scratch folder
+        if self.planner == "strips":
+            return self.run_planner(individual)
+        worker_folder, worker_name = self.get_worker_folder()
+        return self.run_planner(individual, planner_folder=worker_folder, name=worker_name)
+
+    def perform_worker_batch_planning(self, individuals):
+        if not individuals:
+            return []
+        worker_folder, worker_name = self.get_worker_folder()
+        return self.run_planner_batch(individuals, planner_folder=worker_folder, name=worker_name)
+
+    def get_executor(self):
+        # Pool is created once and reused for all generations
+        if self._executor is None:
+            if self.executor == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+            elif self.executor == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    initializer=_init_planning_worker,
+                    initargs=(self,)
+                )
+            else:
+                raise ValueError(f"Unknown executor: {self.executor}")
+        return self._executor
+
+    def plan_population(self, population):
+        # Generate plans for all individuals, in parallel if more than one worker is used
+        # Cache is looked up in main process, only missing plans are sent to planner
+        solutions = [None if self.is_plannable(individual) else [] for individual in population]
+        keys = [None] * len(population)
+        if self.plan_cache is not None:
+            planner_settings = self.planner_settings()
+            for i, individual in enumerate(population):
+                if solutions[i] is None:
+                    keys[i] = self.plan_cache.key(individual, self.dd, planner_settings)
+                    solutions[i] = self.plan_cache.get(keys[i])
+        if self.plan_reuse:
+            for i, individual in enumerate(population):
+                if solutions[i] is None:
+                    solutions[i] = self.reuse_parent_solution(individual)
+                    if solutions[i] is not None and self.plan_cache is not None:
+                        self.plan_cache.put(keys[i], solutions[i])
+        missing = [i for i, solution in enumerate(solutions) if solution is None]
+        individuals_to_plan = [population[i] for i in missing]
+        self.planner_calls += len(individuals_to_plan)
+
+        if self.executor == "async" and self.planner == "hsp":
+            new_solutions = self.planner_runner(individuals_to_plan)
+        elif self.batch_planning and self.planner == "hsp":
+            # One batch of problems per worker
+            batch_size = max(1, -(-len(individuals_to_plan) // max(1, self.num_workers)))
+            batches = [individuals_to_plan[i:i + batch_size] for i in range(0, len(individuals_to_plan), batch_size)]
+            if self.num_workers <= 1:
+                batch_solutions = map(self.perform_worker_batch_planning, batches)
+            elif self.executor == "thread":
+                batch_solutions = self.get_executor().map(self.perform_worker_batch_planning, batches)
+            else:
+                batches = [[self.dd.individual_to_keys(individual) for individual in batch] for batch in batches]
+                batch_solutions = self.merge_worker_results(self.get_executor().map(_plan_batch_in_worker, batches))
+            new_solutions = itertools.chain(*batch_solutions)
+        elif self.num_workers <= 1 or self.executor == "async":
+            new_solutions = map(self.run_planner, individuals_to_plan)
+        elif self.executor == "thread":
+            new_solutions = self.get_executor().map(self.perform_worker_planning, individuals_to_plan)
+        else:
+            chunksize = max(1, len(individuals_to_plan) // (self.num_workers * 4))
+            individuals_keys = [self.dd.individual_to_keys(individual) for individual in individuals_to_plan]
+            new_solutions = self.merge_worker_results(self.get_executor().map(_plan_in_worker, individuals_keys, chunksize=chunksize))
+
+        for i, solution in zip(missing, new_solutions):
+            solutions[i] = solution
+            if self.plan_cache is not None and self.is_cacheable(solution):
+                self.plan_cache.put(keys[i], solution)
+
+        if self.profiler is not None:
+            self.profiler.count("planner_calls", len(individuals_to_plan))
+            self.profiler.count("planner_budget_exceeded", sum(1 for i in missing if not self.is_cacheable(solutions[i])))
+
+        return solutions
+
+    def merge_worker_results(self, results):
+        # Solutions of planning worker processes, phases timed in workers are merged into profiler
+        for solution, events in results:
+            if self.profiler is not None:
+                self.profiler.merge_worker_events(events)
+            yield solution
+
+    def reuse_parent_solution(self, individual):
+        # First plan of a parent that is still valid for individual (or None)
+        for solution in getattr(individual, "parent_solutions", ()):
+            if self.strips_planner.validate_plan(individual, solution):
+                self.plans_reused += 1
+                return solution
+        return None
+
+    def pop_generation_stats(self):
+        # Planner statistics of generations evaluated since last call
+        generation_stats, self.generation_stats = self.generation_stats, []
+        return generation_stats
+
+    def pop_planner_stats(self):
+        # Planner timeouts and kills and planner calls done and saved since last generation
+        stats = {"planner_" + name: value for name, value in self.planner_runner.pop_stats().items()}
+        if self.planner == "strips":
+            stats["planner_timeouts"] += self.strips_planner.timeouts
+            self.strips_planner.timeouts = 0
+
+        totals = {"planner_calls": self.planner_calls, "planner_calls_avoided": self.planner_calls_avoided, "plans_reused": self.plans_reused}
+        last_totals = getattr(self, "_last_planner_totals", dict.fromkeys(totals, 0))
+        for name, value in totals.items():
+            stats[name] = value - last_totals[name]
+        self._last_planner_totals = totals
+
+        return stats
+
+    def close(self, remove_folders=True):
+        # Stop planning workers and remove their scratch folders
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        if self.profiler is not None:
+            self.profiler.close()
+
+        if remove_folders:
+            for worker_folder in glob.glob(os.path.join(self.scratch_folder, "worker_*")):
+                shutil.rmtree(worker_folder, ignore_errors=True)
+            if self.scratch_folder != self.planner_folder:
+                shutil.rmtree(self.scratch_folder, ignore_errors=True)
+
+    def problem_to_pddl(self, individual, name="Individual"):
+        # PDDL problem of individual built in memory in one pass
+        literals = [self.dd.literal_keys[literal] for literal in individual[0]]
+
+        lines = [f"(define (problem {name})", f"\t(:domain {self.dd.name})"]
 
-            for precondition in preconditions:
-                f.write(f"\n\t\t({precondition['name']}")
-                for v in precondition['values']:
-                    f.write(f" {v}")
-                f.write(")")
+        # objects
+        lines.append("\t(:objects")
+        lines += [f"\t\t{object_name}" for (kind, type, object_name) in literals if kind == "object"]
+        lines.append("\t)")
 
-            f.write("\n\t)")
+        # preconditions
+        lines.append("\t(:init")
+        lines += [f"\t\t({' '.join([relation, *values])})" for (kind, relation, values) in literals if kind == "relation"]
+        lines.append("\t)")
 
         # effects
-        effects = individual[1]
-
-        with open(filename, 'a') as f:
-            f.write("\n\t(:goal")
-            f.write("\n\t\t(and")
+        lines.append("\t(:goal")
+        lines.append("\t\t(and")
+        goals = [self.dd.literal_keys[literal] for literal in individual[1]]
+        lines += [f"\t\t\t({' '.join([relation, *values])})" for (kind, relation, values) in goals]
+        lines.append("\t\t)")
+        lines.append("\t)")
 
-            for effect in effects:
-                f.write(f"\n\t\t\t({effect['name']}")
-                for v in effect['values']:
-                    f.write(f" {v}")
-                f.write(")")
+        lines.append(")")
+        return "\n".join(lines)
 
-            f.write("\n\t\t)")
-            f.write("\n\t)")
+    def convert_individual_to_pddl_format(self, individual, name="Individual", planner_folder=None):
+        # returns the resulting pddl filename
+        filename = os.path.join(planner_folder or self.planner_folder, name + '.pddl')
 
-            f.write("\n)")
+        with self.phase("pddl_writing"):
+            with open(filename, 'w') as f:
+                f.write(self.problem_to_pddl(individual, name))
 
         return filename
 
-    def extract_actions_from_plan(self, solution):
-        # Convert file with solutions to list of actions
-        actions = []
+    def write_problems(self, individuals, names, planner_folder):
+        # Write PDDL problems of whole population and list of problems for the planner, returns problem filenames
+        filenames = [self.convert_individual_to_pddl_format(individual, name, planner_folder) for individual, name in zip(individuals, names)]
+        self.write_problems_file(planner_folder, names)
+        return filenames
+
+    def iter_plan_actions(self, solution):
+        # Action ids of plan, parsed line by line as they are read from solution (any iterable of lines)
         for line in solution:
             line = line.strip()
             if line.startswith("("):
-                line = re.sub(r"[()]+", "", line)
+                line = line.translate(remove_parentheses)
                 if line:
-                    action = line.split()[0].lower()
-                    actions.append(action)
+                    yield self.dd.action_ids[line.split(None, 1)[0].lower()]
+
+    def extract_actions_from_plan(self, solution):
+        # Convert file with solutions to list of action ids (empty if plan is longer than max plan length)
+        actions = []
+        for action in self.iter_plan_actions(solution):
+            actions.append(action)
+            if self.max_plan_length is not None and len(actions) > self.max_plan_length:
+                return []
         return actions
 
     def rescale_story_arc(self, story_arc, story_arc_scaling_factor):
         # Rescale story arc to length of scaling_factor
-        # (index generated in range (1, story_arc_scaling_factor) as in the paper and lowered by 1 to match list indexing)
-        scaled_story_arc = [
-            story_arc[int(np.ceil((i-1)/story_arc_scaling_factor*(len(story_arc)-1))+1-1)]
-            for i in range(1, story_arc_scaling_factor+1)
-        ]
-        return scaled_story_arc
+        return [story_arc[i] for i in rescale_indexes(len(story_arc), story_arc_scaling_factor)]
 
     def evaluate_individual(self, individual, desired_story_arc, story_arc_scaling_factor=10):
         # Evaluate individual as described in the paper
@@ -186,89 +624,177 @@ class GeneticAlgorithm:
 
         # Generate plan for individual
         solution = self.perform_planning(individual)
+
+        return self.evaluate_solution(solution, desired_story_arc, story_arc_scaling_factor)
+
+    def evaluate_solution(self, solution, desired_story_arc, story_arc_scaling_factor=10):
         # Extract actions from plan
         actions = self.extract_actions_from_plan(solution)
+        return float(self.score_population([actions], desired_story_arc, story_arc_scaling_factor)[0])
+
+    def score_population(self, action_sequences, desired_story_arc, story_arc_scaling_factor=10):
+        # Fitness of all action sequences at once
+        #  sequences of the same length are scored together as one matrix
+        fitness = np.zeros(len(action_sequences))
+
+        # Rescale desired story arc to common time frame
+        scaled_desired_arc = np.asarray(desired_story_arc)[rescale_indexes(len(desired_story_arc), story_arc_scaling_factor)]
+
         # Fitness is 0 for unsolvable individuals
-        if not actions:
-            return 0
+        sequences_by_length = defaultdict(list)
+        for i, actions in enumerate(action_sequences):
+            if len(actions):
+                sequences_by_length[len(actions)].append(i)
 
-        # Convert actions to tension arc
-        tension_arc = [self.dd.event_effects[action] for action in actions]
-        tension_arc = [sum(tension_arc[:i+1]) for i in range(len(tension_arc))]
+        for length, indexes in sequences_by_length.items():
+            # Convert actions to tension arcs
+            action_ids = np.array([action_sequences[i] for i in indexes])
+            tension_arcs = np.cumsum(self.dd.event_effects_array[action_ids], axis=1)
 
-        # Rescale both story arcs to common time frame
-        scaled_desired_arc = self.rescale_story_arc(desired_story_arc, story_arc_scaling_factor)
-        scaled_tension_arc = self.rescale_story_arc(tension_arc, story_arc_scaling_factor)
+            # Rescale tension arcs to common time frame
+            scaled_tension_arcs = tension_arcs[:, rescale_indexes(length, story_arc_scaling_factor)]
 
-        # Calculate loss between two story arcs
-        mse = sum([(tension_p-tension_d)**2 for tension_p, tension_d in zip(scaled_tension_arc, scaled_desired_arc)])/story_arc_scaling_factor
-        fitness = len(tension_arc)/mse
+            # Calculate loss between story arcs
+            mse = np.sum((scaled_tension_arcs - scaled_desired_arc)**2, axis=1)/story_arc_scaling_factor
+            with np.errstate(divide="ignore"):
+                fitness[indexes] = length/mse
 
         return fitness
 
     def evaluate_population(self, population, desired_story_arc):
         # Evaluate population according to their story arcs and desired story arc
-        evaluated_population = []
-        for individual in population:
-            evaluated_population.append(
-                {
-                    "individual": individual,
-                    "fitness": self.evaluate_individual(individual, desired_story_arc)
-                }
-            )
+        return self.evaluate_populations([population], [desired_story_arc])[0]
+
+    def evaluate_populations(self, populations, desired_story_arcs):
+        # Evaluate each population according to its desired story arc
+        # Every distinct individual of all populations is planned once and its actions are extracted once,
+        # only fitness is scored separately for each story arc, duplicates share plan and fitness
+        keys = [[canonical_key(individual) for individual in population] for population in populations]
+        distinct_individuals = {}
+        for population_keys, population in zip(keys, populations):
+            for key, individual in zip(population_keys, population):
+                distinct_individuals.setdefault(key, individual)
+
+        with self.phase("planning"):
+            solutions = dict(zip(distinct_individuals.keys(), self.plan_population(list(distinct_individuals.values()))))
+        with self.phase("action_parsing"):
+            actions = {key: self.extract_actions_from_plan(solution) for key, solution in solutions.items()}
+
+        population_size = sum(len(population) for population in populations)
+        stats = self.pop_planner_stats()
+        stats["duplicate_ratio"] = 1 - len(distinct_individuals) / population_size if population_size else 0
+        self.generation_stats.append(stats)
+
+        evaluated_populations = []
+        for population_keys, population, desired_story_arc in zip(keys, populations, desired_story_arcs):
+            distinct_keys = list(dict.fromkeys(population_keys))
+            with self.phase("scoring"):
+                fitness = dict(zip(distinct_keys, self.score_population([actions[key] for key in distinct_keys], desired_story_arc)))
+
+            evaluated_population = []
+            for key, individual in zip(population_keys, population):
+                evaluated_population.append(
+                    {
+                        "individual": individual,
+                        "fitness": float(fitness[key]),
+                        "solution": solutions[key]
+                    }
+                )
+            evaluated_populations.append(evaluated_population)
+
+        if self.profiler is not None:
+            self.profiler.record_solutions(actions.values())
+            self.profiler.end_generation(stats)
+
+        return evaluated_populations
+
+    def evaluate_offspring(self, population, desired_story_arc):
+        # Evaluate population, pre-screened by surrogate model if it is used
+        if self.surrogate is None or not self.surrogate.trained:
+            evaluated_population = self.evaluate_population(population, desired_story_arc)
+            if self.surrogate is not None:
+                self.surrogate.fit(evaluated_population)
+            return evaluated_population
+
+        predictions = self.surrogate.predict(population)
+        order = np.argsort(-predictions, kind="stable")
+        num_evaluated = int(np.ceil(self.surrogate_fraction * len(population)))
+        num_explored = min(int(round(self.surrogate_exploration * num_evaluated)), len(population) - num_evaluated)
+
+        # Best predicted individuals and a few random others are planned
+        chosen = list(order[:num_evaluated - num_explored])
+        if num_explored:
+            chosen += list(self.rng.choice(order[num_evaluated - num_explored:], num_explored, replace=False))
+        chosen_evaluations = self.evaluate_population([population[i] for i in chosen], desired_story_arc)
+        self.surrogate.fit(chosen_evaluations)
+
+        evaluated_population = [
+            {
+                "individual": individual,
+                "fitness": float(prediction) if self.surrogate_fill == "predicted" else 0.0,
+                "solution": None,
+                "predicted": True
+            }
+            for individual, prediction in zip(population, predictions)
+        ]
+        for i, evaluation in zip(chosen, chosen_evaluations):
+            evaluated_population[i] = evaluation
+
+        return evaluated_population
+
+    def evaluate_controlled(self, population, desired_story_arc):
+        # Evaluate offspring and report generation to run controller
+        planner_calls = self.planner_calls
+        evaluated_population = self.evaluate_offspring(population, desired_story_arc)
+        if self.run_controller is not None:
+            self.run_controller.update(evaluated_population, self.planner_calls - planner_calls)
         return evaluated_population
 
     def remove_invalid_relations(self, individual):
         # Remove relations in individual that don't match objects of its plot
-        objects = []
-        for literal in individual[0]:
-            if "type" in literal.keys():
-                objects.append(literal["name"])
-
-        for literal in individual[0]:
-            if "values" in literal.keys():
-                for value in literal["values"]:
-                    if value not in objects:
-                        individual[0].remove(literal)
-                        break
-
-        for literal in individual[1]:
-            if "values" in literal.keys():
-                for value in literal["values"]:
-                    if value not in objects:
-                        individual[1].remove(literal)
-                        break
-
-        return individual
+        #  parts without invalid relations are kept (not copied)
+        objects = individual.object_ids(self.dd)
+
+        start, goal = individual
+        if not all(self.dd.literal_objects[literal] <= objects for literal in start):
+            start = tuple(literal for literal in start if self.dd.literal_objects[literal] <= objects)
+        if not all(self.dd.literal_objects[literal] <= objects for literal in goal):
+            goal = tuple(literal for literal in goal if self.dd.literal_objects[literal] <= objects)
+
+        return individual.replace(start, goal)
 
     def perform_crossover(self, selected_individuals):
         # Select pairs of individuals for reproduction at random
         all_pairs = list(itertools.combinations_with_replacement(selected_individuals, 2))
         # Each pair produces two children so we take self.population_size//2 pairs
-        pairs_to_reproduce_idxs = np.random.choice(len(all_pairs), self.population_size//2, replace=False)
+        pairs_to_reproduce_idxs = self.rng.choice(len(all_pairs), self.population_size//2, replace=False)
         pairs_to_reproduce = [all_pairs[idx] for idx in pairs_to_reproduce_idxs]
 
         new_population = []
 
         for individual_1, individual_2 in pairs_to_reproduce:
             # Select split points for start and goal according to length of shortest parent
+            smallest_individual_start_length = min(len(individual_1["individual"][0]), len(individual_2["individual"][0]))
+            smallest_individual_goal_length = min(len(individual_1["individual"][1]), len(individual_2["individual"][1]))
+            start_split_point = self.rng.integers(0, smallest_individual_start_length - 1) if smallest_individual_start_length - 1 > 0 else 0
+            goal_split_point = self.rng.integers(0, smallest_individual_goal_length - 1) if smallest_individual_goal_length - 1 > 0 else 0
+
+            # Generate offspring (plans of parents are candidate plans of children)
+            parent_solutions = tuple(parent["solution"] for parent in [individual_1, individual_2] if parent.get("solution"))
             individual_1 = individual_1["individual"]
             individual_2 = individual_2["individual"]
-            smallest_individual_start_length = min(len(individual_1[0]), len(individual_2[0]))
-            smallest_individual_goal_length = min(len(individual_1[1]), len(individual_2[1]))
-            start_split_point = np.random.randint(0, smallest_individual_start_length - 1) if smallest_individual_start_length - 1 > 0 else 0
-            goal_split_point = np.random.randint(0, smallest_individual_goal_length - 1) if smallest_individual_goal_length - 1 > 0 else 0
-
-            # Generate offspring
-            child_1 = [
-                individual_1[0][:start_split_point] + individual_2[0][start_split_point:],
-                individual_1[1][:goal_split_point] + individual_2[1][goal_split_point:]
-            ]
 
-            child_2 = [
-                individual_2[0][:start_split_point] + individual_1[0][start_split_point:],
-                individual_2[1][:goal_split_point] + individual_1[1][goal_split_point:]
-            ]
+            child_1 = Individual(
+                splice(individual_1[0], individual_2[0], start_split_point),
+                splice(individual_1[1], individual_2[1], goal_split_point),
+                parent_solutions
+            )
+
+            child_2 = Individual(
+                splice(individual_2[0], individual_1[0], start_split_point),
+                splice(individual_2[1], individual_1[1], goal_split_point),
+                parent_solutions
+            )
 
             child_1 = self.remove_invalid_relations(child_1)
             child_2 = self.remove_invalid_relations(child_2)
@@ -282,59 +808,57 @@ class GeneticAlgorithm:
         # Target: 0 - start, 1 - goal, 2 - both
         # Get objects of the plot
         objects = defaultdict(list)
-        for literal in individual[0]:
-            if "type" in literal.keys():
-                objects[literal["type"]].append(literal["name"])
+        for literal in individual.object_ids(self.dd):
+            kind, object_type, name = self.dd.literal_keys[literal]
+            objects[object_type].append(name)
 
         # Filter valid predicates for objects of the plot
-        predicates = [
-            predicate
-            for predicate in self.dd.predicates
-            if np.all([len(objects[parameter["type"]]) for parameter in predicate["parameters"]])
-        ]
+        predicates = self.dd.predicates_for_types(frozenset(objects))
 
         # If no literals can be added, return unchanged individual
         if not predicates:
             return individual
 
+        start, goal = individual
         if target in [0, 2]:
             # Choose start relation of the plot
-            start_predicate = np.random.choice(predicates)
-            start_relation = self.dd.relation_representation(start_predicate["name"], [np.random.choice(objects[parameter["type"]]) for parameter in start_predicate["parameters"]])
-            individual[0].append(start_relation)
+            start_predicate = predicates[self.rng.integers(len(predicates))]
+            start_relation = self.dd.relation_id(start_predicate["name"], [objects[parameter["type"]][self.rng.integers(len(objects[parameter["type"]]))] for parameter in start_predicate["parameters"]])
+            start = start + (start_relation,)
         if target in [1, 2]:
             # Choose goal relation of the plot
-            goal_predicate = np.random.choice(predicates)
-            goal_relation = self.dd.relation_representation(goal_predicate["name"], [np.random.choice(objects[parameter["type"]]) for parameter in goal_predicate["parameters"]])
-            individual[1].append(goal_relation)
+            goal_predicate = predicates[self.rng.integers(len(predicates))]
+            goal_relation = self.dd.relation_id(goal_predicate["name"], [objects[parameter["type"]][self.rng.integers(len(objects[parameter["type"]]))] for parameter in goal_predicate["parameters"]])
+            goal = goal + (goal_relation,)
 
-        return individual
+        return individual.replace(start, goal)
 
     def remove_literal_from_individual(self, individual, target):
         # Target: 0 - start, 1 - goal, 2 - both
+        start, goal = individual
         if target in [0, 2]:
             # Don't remove objects from individual, only relations
-            possible_literals_to_remove = [literal for literal in individual[0] if "type" not in literal.keys()]
+            possible_literals_to_remove = [i for i, literal in enumerate(start) if not self.dd.is_object(literal)]
             if possible_literals_to_remove:
-                literal_to_remove = np.random.choice(possible_literals_to_remove)
-                individual[0].remove(literal_to_remove)
+                i = self.rng.choice(possible_literals_to_remove)
+                start = start[:i] + start[i + 1:]
         if target in [1, 2]:
             # Don't remove objects from individual, only relations
-            possible_literals_to_remove = [literal for literal in individual[1] if "type" not in literal.keys()]
+            possible_literals_to_remove = [i for i, literal in enumerate(goal) if not self.dd.is_object(literal)]
             if possible_literals_to_remove:
-                literal_to_remove = np.random.choice(possible_literals_to_remove)
-                individual[1].remove(literal_to_remove)
-        return individual
+                i = self.rng.choice(possible_literals_to_remove)
+                goal = goal[:i] + goal[i + 1:]
+        return individual.replace(start, goal)
 
     def perform_mutation(self, population):
         new_population = []
 
         for individual in population:
-            if np.random.rand() < self.mutation_prob:
+            if self.rng.random() < self.mutation_prob:
                 # Start, goal or both
-                mutation_target = np.random.choice(3)
+                mutation_target = self.rng.choice(3)
                 # Add, remove or both
-                mutation_type = np.random.choice(3)
+                mutation_type = self.rng.choice(3)
 
                 if mutation_type in [0, 2]:
                     individual = self.add_literal_to_individual(individual, mutation_target)
@@ -354,37 +878,235 @@ class GeneticAlgorithm:
         elite_individuals = sorted_individuals[:elite_individuals_to_copy]
         remaining_individuals = sorted_individuals[elite_individuals_to_copy:]
 
+        infinite = [np.isinf(individual["fitness"]) for individual in remaining_individuals]
         max_sum = sum([individual["fitness"] for individual in remaining_individuals])
-        if max_sum != 0:
+        if any(infinite):
+            # Individuals matching desired story arc exactly (infinite fitness) are chosen for sure
+            selection_probs = [is_infinite / sum(infinite) for is_infinite in infinite]
+        elif max_sum != 0:
             selection_probs = [individual["fitness"] / max_sum for individual in remaining_individuals]
         else:
             selection_probs = [1 / len(remaining_individuals) for individual in remaining_individuals]
 
         chosen_remaining_individuals = [
             remaining_individuals[idx]
-            for idx in np.random.choice(len(remaining_individuals), p=selection_probs, size=self.population_size-elite_individuals_to_copy)
+            for idx in self.rng.choice(len(remaining_individuals), p=selection_probs, size=self.population_size-elite_individuals_to_copy)
         ]
 
         return elite_individuals + chosen_remaining_individuals
 
-    def __call__(self, generations, num_quests, desired_story_arc):
-        # Generate quests according to algorithm schema from paper
-        quests = []
+    def save_checkpoint(self, generation=None):
+        # Save progress of generate_quests with state of current quest after given number of generations
+        if self.checkpoint_filename is None or self.quest_run is None:
+            return
+        if generation is not None and generation % self.checkpoint_interval:
+            return
+
+        state = dict(self.quest_run)
+        state["rng"] = self.rng.bit_generator.state
+        state["surrogate"] = self.surrogate.state() if self.surrogate is not None else None
+        state["generation"] = generation
+        if generation is not None:
+            # Individuals are saved as literal keys, literal ids are not the same in resumed process
+            state["population"] = [
+                (self.dd.individual_to_keys(evaluated["individual"]), evaluated["fitness"], evaluated["solution"], evaluated.get("predicted", False))
+                for evaluated in self.population
+            ]
+            state["population_size"] = self.population_size
+            state["run_controller"] = self.run_controller.state() if self.run_controller is not None else None
+        save_checkpoint(self.checkpoint_filename, state)
+
+    def restore_quest_state(self, state):
+        # Restore current quest from checkpoint, returns number of generations already done
+        self.rng.bit_generator.state = state["rng"]
+        self.population = []
+        for individual, fitness, solution, predicted in state["population"]:
+            evaluated = {"individual": Individual(*self.dd.individual_from_keys(individual)), "fitness": fitness, "solution": solution}
+            if predicted:
+                evaluated["predicted"] = True
+            self.population.append(evaluated)
+        self.population_size = state["population_size"]
+        if self.run_controller is not None and state["run_controller"] is not None:
+            self.run_controller.restore(state["run_controller"])
+        return state["generation"]
+
+    def load_quest_run(self, run):
+        # Start progress of generate_quests, restored from checkpoint of the same run if there is one
+        state = load_checkpoint(self.checkpoint_filename) if self.checkpoint_filename else None
+        if state is not None and state["run"] != run:
+            raise ValueError(f"Checkpoint {self.checkpoint_filename} belongs to another run")
+
+        self.quest_run = {"run": run, "completed": {}}
+        if state is not None:
+            self.quest_run["completed"] = state["completed"]
+            self.rng.bit_generator.state = state["rng"]
+            if self.surrogate is not None and state["surrogate"] is not None:
+                self.surrogate.restore(state["surrogate"])
+            if "seeds" in state:
+                self.quest_run["seeds"] = state["seeds"]
+        return state
+
+    def run_settings(self):
+        # Settings which change generated quests, checkpoint of a run with other settings can't be resumed
+        return {
+            "population_size": self.population_size,
+            "mutation_prob": self.mutation_prob,
+            "elitism_factor": self.elitism_factor,
+            "start_size": list(self.start_size),
+            "goal_size": list(self.goal_size),
+            "seed": self.seed,
+            "planner": self.planner,
+            "reachability_filter": self.reachability_filter,
+            "plan_reuse": self.plan_reuse,
+            "max_plan_length": self.max_plan_length,
+            "planner_timeout": self.planner_runner.timeout,
+            "planner_memory_limit": self.planner_runner.memory_limit,
+            "surrogate": self.surrogate.config() if self.surrogate is not None else None,
+            "surrogate_fraction": self.surrogate_fraction,
+            "surrogate_exploration": self.surrogate_exploration,
+            "surrogate_fill": self.surrogate_fill,
+            "run_controller": self.run_controller.config() if self.run_controller is not None else None
+        }
+
+    def finish_quest_run(self):
+        # Checkpoint of finished run is removed, so that next run starts anew
+        if self.checkpoint_filename is not None:
+            remove_checkpoint(self.checkpoint_filename)
+        self.quest_run = None
+
+    def run_quest(self, generations, desired_story_arc, resume=None):
+        # Generate one quest according to algorithm schema from paper, returns best individual with its plan
+        # With run controller generations is upper bound of generations and population size may change during run
+        controller = self.run_controller
+        population_size = self.population_size
+        if resume is not None:
+            first_generation = self.restore_quest_state(resume)
+        else:
+            if controller is not None:
+                controller.start()
 
-        for quest in tqdm(range(num_quests)):
             population = self.generate_initial_population()
-            self.population = self.evaluate_population(population, desired_story_arc)
+            self.population = self.evaluate_controlled(population, desired_story_arc)
+            first_generation = 0
+            self.save_checkpoint(0)
+
+        for generation in range(first_generation, generations):
+            if controller is not None and controller.should_stop():
+                break
+
+            # Shrinking population selects less parents, growing population gets new random individuals
+            next_population_size = controller.next_population_size(self.population_size) if controller is not None else self.population_size
+            self.population_size = min(self.population_size, next_population_size)
 
-            for generation in range(generations):
+            with self.phase("selection"):
                 best_individuals = self.select_best_individuals()
+            with self.phase("crossover"):
                 population = self.perform_crossover(best_individuals)
+            with self.phase("mutation"):
                 population = self.perform_mutation(population)
-                population = [self.remove_invalid_relations(individual) for individual in population]
-                self.population = self.evaluate_population(population, desired_story_arc)
+            population = [self.remove_invalid_relations(individual) for individual in population]
+            population += self.generate_random_individuals(next_population_size - self.population_size)
+            self.population_size = next_population_size
+
+            self.population = self.evaluate_controlled(population, desired_story_arc)
+            self.save_checkpoint(generation + 1)
+
+        self.population_size = population_size
+
+        # Only individuals evaluated by planner (not by surrogate model) can be returned
+        best_quest = max(
+            [evaluated for evaluated in self.population if not evaluated.get("predicted")],
+            key=lambda x: x["fitness"]
+        )
+        return best_quest["individual"], best_quest["solution"]
+
+    def run_quests_for_arcs(self, generations, desired_story_arcs):
+        # Evolve one population per desired story arc in a single run, returns best individual with its plan for each arc
+        # All populations are planned together (plans are shared), surrogate model and run controller are not used
+        populations = [self.generate_initial_population() for desired_story_arc in desired_story_arcs]
+        evaluated_populations = self.evaluate_populations(populations, desired_story_arcs)
+
+        for generation in range(generations):
+            populations = []
+            for evaluated_population in evaluated_populations:
+                self.population = evaluated_population
+                with self.phase("selection"):
+                    best_individuals = self.select_best_individuals()
+                with self.phase("crossover"):
+                    population = self.perform_crossover(best_individuals)
+                with self.phase("mutation"):
+                    population = self.perform_mutation(population)
+                populations.append([self.remove_invalid_relations(individual) for individual in population])
+            evaluated_populations = self.evaluate_populations(populations, desired_story_arcs)
+
+        best_quests = [max(evaluated_population, key=lambda x: x["fitness"]) for evaluated_population in evaluated_populations]
+        return [(best_quest["individual"], best_quest["solution"]) for best_quest in best_quests]
+
+    def generate_quests_for_arcs(self, generations, num_quests, desired_story_arcs):
+        # Yield list of quests (in dict representation) with their plans, one for each desired story arc, per quest
+        for quest in range(num_quests):
+            yield [
+                (self.dd.individual_to_dicts(quest), solution)
+                for quest, solution in self.run_quests_for_arcs(generations, desired_story_arcs)
+            ]
 
-            best_quest = max(self.population, key=lambda x: x["fitness"])
-            quests.append(best_quest["individual"])
+    def generate_for_arcs(self, generations, num_quests, desired_story_arcs):
+        # Generate quests for several desired story arcs at once, returns list of quests with plans for each arc
+        quests_with_plans = list(tqdm(self.generate_quests_for_arcs(generations, num_quests, desired_story_arcs), total=num_quests))
+
+        self.close()
+
+        return [list(arc_quests) for arc_quests in zip(*quests_with_plans)] if quests_with_plans else [[] for desired_story_arc in desired_story_arcs]
+
+    def generate_quests(self, generations, num_quests, desired_story_arc, quest_workers=1):
+        # Yield each quest (in dict representation) with its plan as soon as it is generated
+        #  with quest_workers > 1 independent quest runs are done in a process pool and yielded in order of completion
+        #  with checkpoint quests completed before interruption are yielded first
+        run = {
+            "identity": self.dd.identity,
+            "generations": generations,
+            "num_quests": num_quests,
+            "desired_story_arc": list(desired_story_arc),
+            "parallel": quest_workers > 1,
+            "settings": self.run_settings()
+        }
+        state = self.load_quest_run(run)
+        completed = self.quest_run["completed"]
+        for quest in sorted(completed):
+            yield completed[quest]
+
+        if quest_workers <= 1:
+            # Quest interrupted in the middle is resumed from its last saved generation
+            resume = state if state is not None and state["generation"] is not None else None
+            for quest in range(len(completed), num_quests):
+                individual, solution = self.run_quest(generations, desired_story_arc, resume)
+                resume = None
+                completed[quest] = (self.dd.individual_to_dicts(individual), solution)
+                self.save_checkpoint()
+                yield completed[quest]
+            self.finish_quest_run()
+            return
+
+        # Seeds of quests are saved, so that resumed run only runs missing quests
+        if "seeds" not in self.quest_run:
+            self.quest_run["seeds"] = [int(seed) for seed in self.rng.integers(2**63, size=num_quests)]
+        seeds = self.quest_run["seeds"]
+        with ProcessPoolExecutor(max_workers=quest_workers) as executor:
+            futures = {
+                executor.submit(_run_quest_in_worker, self, seeds[quest], generations, desired_story_arc): quest
+                for quest in range(num_quests)
+                if quest not in completed
+            }
+            for future in as_completed(futures):
+                completed[futures[future]] = future.result()
+                self.save_checkpoint()
+                yield completed[futures[future]]
+        self.finish_quest_run()
+
+    def __call__(self, generations, num_quests, desired_story_arc, quest_workers=1):
+        # Generate quests according to algorithm schema from paper
+        quests_with_plans = list(tqdm(self.generate_quests(generations, num_quests, desired_story_arc, quest_workers), total=num_quests))
 
-        quests_with_plans = [(quest, self.perform_planning(quest)) for quest in quests]
+        self.close()
 
         return quests_with_plans
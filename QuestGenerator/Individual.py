@@ -0,0 +1,62 @@
+def canonical_key(individual):
+    # Key of (start, goal) pair ignoring order and repetitions of literals
+    return frozenset(individual[0]), frozenset(individual[1])
+
+
+def splice(head, tail, split_point):
+    # head[:split_point] + tail[split_point:], sharing a whole tuple instead of copying it when possible
+    if split_point == 0 or head is tail:
+        return tail
+    return head[:split_point] + tail[split_point:]
+
+
+class Individual:
+    # Immutable plot: start and goal as tuples of literal ids (see DomainDatabase symbol table)
+    #  behaves like (start, goal) pair and remembers solutions of its parents as candidate plans
+    #  changed copies share unchanged tuples, so variation operators allocate only what they change
+    __slots__ = ("start", "goal", "parent_solutions", "_object_ids")
+
+    def __init__(self, start, goal, parent_solutions=()):
+        self.start = start
+        self.goal = goal
+        self.parent_solutions = parent_solutions
+        self._object_ids = None
+
+    def __getitem__(self, i):
+        return (self.start, self.goal)[i]
+
+    def __iter__(self):
+        yield self.start
+        yield self.goal
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash((self.start, self.goal))
+
+    def __repr__(self):
+        return f"Individual({self.start}, {self.goal})"
+
+    def object_ids(self, domain_database):
+        # Objects of the plot (computed once and shared by copies with the same start)
+        if self._object_ids is None:
+            self._object_ids = frozenset(literal for literal in self.start if domain_database.is_object(literal))
+        return self._object_ids
+
+    def replace(self, start=None, goal=None):
+        # Changed copy sharing unchanged parts and lineage
+        if (start is None or start is self.start) and (goal is None or goal is self.goal):
+            return self
+
+        individual = Individual(
+            self.start if start is None else start,
+            self.goal if goal is None else goal,
+            self.parent_solutions
+        )
+        if individual.start is self.start:
+            individual._object_ids = self._object_ids
+        return individual
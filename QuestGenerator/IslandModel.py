@@ -0,0 +1,164 @@
+import multiprocessing
+import queue
+import traceback
+
+from PlotGenerator.QuestGenerator.Individual import Individual
+
+
+def ring_topology(num_islands):
+    # Every island sends migrants to the next one
+    return {island: [(island + 1) % num_islands] for island in range(num_islands)}
+
+
+def fully_connected_topology(num_islands):
+    # Every island sends migrants to all other islands
+    return {island: [target for target in range(num_islands) if target != island] for island in range(num_islands)}
+
+
+topologies = {
+    "ring": ring_topology,
+    "fully_connected": fully_connected_topology
+}
+
+
+def _run_island(genetic_algorithm, island, seed, generations, desired_story_arc, migration_interval, migration_size, targets, sources_count, inboxes, results, timeout):
+    # Failure of island is reported to parent process, which stops the whole run
+    try:
+        _evolve_island(genetic_algorithm, island, seed, generations, desired_story_arc, migration_interval, migration_size, targets, sources_count, inboxes, results, timeout)
+    except Exception:
+        results.put((island, "error", traceback.format_exc(), None))
+
+
+def _evolve_island(genetic_algorithm, island, seed, generations, desired_story_arc, migration_interval, migration_size, targets, sources_count, inboxes, results, timeout):
+    ga = genetic_algorithm
+    ga.prepare_subprocess_run(seed)
+
+    population = ga.generate_initial_population()
+    ga.population = ga.evaluate_offspring(population, desired_story_arc)
+
+    # Migrants which arrived for later migration rounds
+    pending = []
+
+    for generation in range(generations):
+        best_individuals = ga.select_best_individuals()
+        population = ga.perform_crossover(best_individuals)
+        population = ga.perform_mutation(population)
+        population = [ga.remove_invalid_relations(individual) for individual in population]
+        ga.population = ga.evaluate_offspring(population, desired_story_arc)
+
+        if (generation + 1) % migration_interval or generation + 1 == generations or not sources_count:
+            continue
+
+        # Send best individuals to neighbours (as literal keys, literal ids differ between processes)
+        migration_round = (generation + 1) // migration_interval
+        ga.population = sorted(ga.population, key=lambda x: x["fitness"], reverse=True)
+        migrants = [
+            (ga.dd.individual_to_keys(migrant["individual"]), migrant["fitness"], migrant["solution"])
+            for migrant in [evaluated for evaluated in ga.population if not evaluated.get("predicted")][:migration_size]
+        ]
+        for target in targets:
+            inboxes[target].put((migration_round, migrants))
+
+        # Wait for migrants of this round from all islands sending to this one
+        received = []
+        received_count = 0
+        for message in pending:
+            if message[0] == migration_round:
+                received += message[1]
+                received_count += 1
+        pending = [message for message in pending if message[0] != migration_round]
+        while received_count < sources_count:
+            try:
+                message = inboxes[island].get(timeout=timeout)
+            except queue.Empty:
+                raise RuntimeError(f"Island {island} received no migrants in {timeout} seconds")
+            if message[0] == migration_round:
+                received += message[1]
+                received_count += 1
+            else:
+                pending.append(message)
+
+        # Immigrants replace worst individuals (their fitness is already known)
+        received = received[:len(ga.population)]
+        immigrants = [
+            {"individual": Individual(*ga.dd.individual_from_keys(individual)), "fitness": fitness, "solution": solution}
+            for individual, fitness, solution in received
+        ]
+        ga.population = ga.population[:len(ga.population) - len(immigrants)] + immigrants
+
+    best_quest = max([evaluated for evaluated in ga.population if not evaluated.get("predicted")], key=lambda x: x["fitness"])
+    results.put((island, ga.dd.individual_to_keys(best_quest["individual"]), best_quest["fitness"], best_quest["solution"]))
+    ga.close(remove_folders=False)
+
+
+class IslandModel:
+    # Island-model genetic algorithm
+    #  sub-populations (of genetic algorithm's population_size) evolve in separate processes
+    #  and every migration_interval generations send their migration_size best individuals to neighbours in topology
+    #  island waiting for migrants longer than timeout seconds fails, failed island stops the whole run
+    def __init__(self, genetic_algorithm, num_islands=4, migration_interval=5, migration_size=2, topology="ring", timeout=None):
+        self.ga = genetic_algorithm
+        self.timeout = timeout
+        self.num_islands = num_islands
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+
+        # Topology: name, function of number of islands or dict island -> islands receiving its migrants
+        if isinstance(topology, str):
+            topology = topologies[topology]
+        if callable(topology):
+            topology = topology(num_islands)
+        self.topology = topology
+
+    def __call__(self, generations, desired_story_arc):
+        # Returns global best quest (in dict representation) with its plan
+        sources_count = [
+            sum(island in targets for targets in self.topology.values())
+            for island in range(self.num_islands)
+        ]
+        seeds = self.ga.rng.integers(2**63, size=self.num_islands)
+
+        inboxes = [multiprocessing.Queue() for _ in range(self.num_islands)]
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=_run_island,
+                args=(
+                    self.ga, island, seeds[island], generations, desired_story_arc,
+                    self.migration_interval, self.migration_size,
+                    self.topology.get(island, []), sources_count[island], inboxes, results, self.timeout
+                )
+            )
+            for island in range(self.num_islands)
+        ]
+        for process in processes:
+            process.start()
+
+        # Results are read before joining, so that no island blocks on a full queue
+        try:
+            island_results = self.collect_results(results, processes)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            self.ga.close()
+
+        island, best_quest, fitness, solution = max(island_results, key=lambda x: x[2])
+        return self.ga.dd.individual_to_dicts(self.ga.dd.individual_from_keys(best_quest)), solution
+
+    def collect_results(self, results, processes):
+        # Results of all islands, fails as soon as an island reports error or dies without result
+        island_results = []
+        while len(island_results) < len(processes):
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                dead = [island for island, process in enumerate(processes) if process.exitcode not in [None, 0]]
+                if dead:
+                    raise RuntimeError(f"Islands {dead} died without result")
+                continue
+            if result[1] == "error":
+                raise RuntimeError(f"Island {result[0]} failed:\n{result[2]}")
+            island_results.append(result)
+        return island_results
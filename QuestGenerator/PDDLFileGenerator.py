@@ -67,44 +67,44 @@ def parse_to_pddl(filename: str):
     dd = DomainDatabase(filename)
 
     filename_no_ext = os.path.splitext(filename)[0]
+    write_pddl_domain(dd, filename_no_ext+'.pddl')
+
+
+def write_pddl_domain(dd, pddl_filename):
+    with open(pddl_filename, 'w') as f:
+        f.write(domain_to_pddl(dd))
+
+
+def domain_to_pddl(dd):
+    # PDDL domain built in memory, types, predicates and actions are written once each
     world_name = dd.name
 
-    with open(filename_no_ext+'.pddl', 'w') as f:
-        f.write(f"(define (domain {world_name})")
-        f.write("\n(:requirements :typing)")
+    d = f"(define (domain {world_name})"
+    d += "\n(:requirements :typing)"
 
     # types
-    done_types = []
-    with open(filename_no_ext+'.pddl', 'a') as f:
-        f.write("\n(:types")
-        for o in dd.objects:
-            if o not in done_types:
-                f.write(f" {o}")
-                done_types.append(o)
-        f.write(")")
+    d += "\n(:types"
+    for o in dict.fromkeys(dd.objects):
+        d += f" {o}"
+    d += ")"
 
     # predicates and relations
-    done_predicates = []
-    with open(filename_no_ext+'.pddl', 'a') as f:
-        f.write("\n(:predicates")
-        for p in dd.predicates:
-            if p['name'] not in done_predicates:
-                f.write(f"\n{predicate_representation(p)}")
-                done_predicates.append(p['name'])
-
-        for r in dd.relations:
-            if r["name"] not in done_predicates:
-                f.write(f"\n{relation_representation(r)}")
-                done_predicates.append(r['name'])
-        f.write("\n)")
+    done_predicates = set()
+    d += "\n(:predicates"
+    for p in dd.predicates:
+        if p['name'] not in done_predicates:
+            d += f"\n{predicate_representation(p)}"
+            done_predicates.add(p['name'])
+
+    for r in dd.relations:
+        if r["name"] not in done_predicates:
+            d += f"\n{relation_representation(r)}"
+            done_predicates.add(r['name'])
+    d += "\n)"
 
     # actions
-    done_actions = []
-    with open(filename_no_ext + '.pddl', 'a') as f:
-        for a in dd.operators:
-            if a not in done_actions:
-                f.write(f"\n{action_representation(a)}")
-                done_actions.append(a)
-
-    with open(filename_no_ext + '.pddl', 'a') as f:
-        f.write("\n)")
+    for a in dict.fromkeys(action_representation(a) for a in dd.operators):
+        d += f"\n{a}"
+
+    d += "\n)"
+    return d
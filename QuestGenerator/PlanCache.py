@@ -0,0 +1,92 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class PlanCache:
+    # Content-addressed cache of planner solutions
+    #  plans (not fitness) are stored, so cached entries stay valid for any desired story arc
+    def __init__(self, max_size=10000, filename=None):
+        self.max_size = max_size
+        self.filename = filename
+
+        self.plans = OrderedDict()  # in-memory LRU tier
+        self.hits = 0
+        self.misses = 0
+        # Cache can be used from several threads (e.g. by service), every access holds the lock
+        self.lock = threading.RLock()
+
+        # Optional on-disk tier surviving between runs
+        self.connection = None
+        if filename:
+            self.connection = sqlite3.connect(filename, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT)")
+            self.connection.commit()
+
+    def key(self, individual, domain_database, planner_settings=None):
+        # Canonical hash of individual - order and repetitions of literals don't change the planning problem
+        #  literal keys (not ids) are hashed so that keys are the same in every run
+        #  planner backends and their settings (e.g. plan length limit) find different plans, so they are part of the key
+        start = sorted(domain_database.literal_keys[literal] for literal in set(individual[0]))
+        goal = sorted(domain_database.literal_keys[literal] for literal in set(individual[1]))
+
+        content = [domain_database.identity, start, goal]
+        if planner_settings is not None:
+            content.append(planner_settings)
+        content = json.dumps(content, sort_keys=True)
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get(self, key):
+        # Returns cached plan or None
+        with self.lock:
+            return self.get_locked(key)
+
+    def get_locked(self, key):
+        if key in self.plans:
+            self.plans.move_to_end(key)
+            self.hits += 1
+            return self.plans[key]
+
+        if self.connection is not None:
+            row = self.connection.execute("SELECT plan FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                plan = json.loads(row[0])
+                self.store_in_memory(key, plan)
+                self.hits += 1
+                return plan
+
+        self.misses += 1
+        return None
+
+    def put(self, key, plan):
+        with self.lock:
+            self.store_in_memory(key, plan)
+
+            if self.connection is not None:
+                self.connection.execute("INSERT OR REPLACE INTO plans VALUES (?, ?)", (key, json.dumps(plan)))
+                self.connection.commit()
+
+    def store_in_memory(self, key, plan):
+        self.plans[key] = plan
+        self.plans.move_to_end(key)
+        # Evict least recently used plans
+        while len(self.plans) > self.max_size:
+            self.plans.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "size": len(self.plans)
+            }
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import signal
+import subprocess
+import time
+
+
+class PlannerBudgetExceeded(list):
+    # Empty plan of a problem whose planner was stopped over its budget
+    #  it is scored like an unsolvable problem, but never cached, so that it can be planned again with more budget
+    pass
+
+
+class AsyncPlannerRunner:
+    # Runs HSP planner for many individuals concurrently with asyncio
+    #  every running planner has its own folder, so the number of folders bounds concurrency
+    #  planners over their wall-clock budget are killed and their individuals stay unsolved (fitness 0),
+    #  memory budget is an address space limit of planner processes
+    #  budgets only apply to solve stage of the planner, problems are compiled without limits
+    def __init__(self, genetic_algorithm, max_concurrency=None, timeout=None, memory_limit=None):
+        self.ga = genetic_algorithm
+        self.max_concurrency = max_concurrency or os.cpu_count()
+        self.timeout = timeout  # seconds
+        self.memory_limit = memory_limit  # bytes
+
+        self.timeouts = 0
+        self.kills = 0
+
+    @property
+    def limited(self):
+        return bool(self.timeout or self.memory_limit)
+
+    def command(self, planner_folder, stage=None):
+        # RunPlanner.sh runs both stages unless stage ("compile" or "solve") is given
+        command = ['sh', os.path.join(self.ga.planner_folder, 'RunPlanner.sh'), os.path.abspath(planner_folder)]
+        if stage == "solve" and self.memory_limit:
+            # Address space limit set by shell (in KiB) is inherited by make, parser and planner
+            #  (no pre-exec hook in Python, which isn't safe while other threads run)
+            return ['sh', '-c', 'ulimit -v "$0" && exec "$@"', str(self.memory_limit // 1024), *command, stage]
+        return command + [stage] if stage else command
+
+    def run_solve_stage(self, planner_folder, problems=1):
+        # Solve stage run synchronously within budget (time budget is per problem of PROBLEMS file),
+        #  returns False if planner was killed over its time budget
+        process = subprocess.Popen(self.command(planner_folder, "solve"), start_new_session=True)
+        try:
+            process.wait(timeout=self.timeout * problems if self.timeout else None)
+            return True
+        except subprocess.TimeoutExpired:
+            self.kill(process)
+            process.wait()
+            return False
+        except BaseException:
+            self.kill(process)
+            raise
+
+    def kill(self, process):
+        # Planner runs in its own session, kill whole process group (sh, make, planner)
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            self.kills += 1
+        except ProcessLookupError:
+            pass
+
+    async def run_planner(self, individual, folders):
+        planner_folder, name = await folders.get()
+        try:
+            problem_filename = self.ga.convert_individual_to_pddl_format(individual, name=name, planner_folder=planner_folder)
+            self.ga.write_problems_file(planner_folder, [name])
+
+            try:
+                # Compile stage has no budget
+                start = time.perf_counter()
+                process = await asyncio.create_subprocess_exec(*self.command(planner_folder, "compile"), start_new_session=True)
+                try:
+                    await process.wait()
+                except asyncio.CancelledError:
+                    self.kill(process)
+                    raise
+                if self.ga.profiler is not None:
+                    self.ga.profiler.add_time("planner_compile", start, time.perf_counter())
+
+                start = time.perf_counter()
+                process = await asyncio.create_subprocess_exec(*self.command(planner_folder, "solve"), start_new_session=True)
+                try:
+                    await asyncio.wait_for(process.wait(), self.timeout)
+                    if self.ga.profiler is not None:
+                        self.ga.profiler.add_time("planner_solve", start, time.perf_counter())
+                    solution = self.ga.read_solution(planner_folder, self.ga.max_plan_length)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self.kill(process)
+                    await process.wait()
+                    solution = PlannerBudgetExceeded()
+                except asyncio.CancelledError:
+                    self.kill(process)
+                    raise
+            finally:
+                os.remove(problem_filename)
+                if os.path.exists(os.path.join(planner_folder, "solutions.all")):
+                    os.remove(os.path.join(planner_folder, "solutions.all"))
+
+            return solution
+        finally:
+            folders.put_nowait((planner_folder, name))
+
+    async def plan_all(self, individuals):
+        folders = asyncio.Queue()
+        for slot in range(self.max_concurrency):
+            name = f"worker_{os.getpid()}_async{slot}"
+            folders.put_nowait((self.ga.prepare_planner_folder(name), name))
+
+        return await asyncio.gather(*[self.run_planner(individual, folders) for individual in individuals])
+
+    def __call__(self, individuals):
+        return asyncio.run(self.plan_all(individuals))
+
+    def pop_stats(self):
+        # Timeouts and kills since last call
+        stats = {"timeouts": self.timeouts, "kills": self.kills}
+        self.timeouts = 0
+        self.kills = 0
+        return stats
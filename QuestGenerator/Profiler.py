@@ -0,0 +1,149 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class Profiler:
+    # Timers and counters of genetic algorithm phases, collected per evaluated generation
+    #  phases: generation, pddl_writing, planner_compile, planner_solve, planner_search, solution_reading
+    #  (reading planner output), action_parsing (plans to action ids), scoring, selection, crossover and mutation
+    #  (and planning, wall time of planning whole generation)
+    #  every finished generation is appended as one JSON line to json_filename,
+    #  phases are also recorded as Chrome trace events written to trace_filename on close
+    #  copies sent to planning worker processes only collect timed phases, which main process merges
+    #  (quest and island processes are not profiled)
+    def __init__(self, json_filename=None, trace_filename=None):
+        self.json_filename = json_filename
+        self.trace_filename = trace_filename
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+        self.generations = []
+        self.trace_events = []
+        self.worker_events = None  # phases timed by worker copy
+        self.reset_generation()
+
+    def __getstate__(self):
+        # Pickled profiler is a worker copy
+        return {"trace_filename": self.trace_filename, "start_time": self.start_time}
+
+    def __setstate__(self, state):
+        self.__init__(trace_filename=state["trace_filename"])
+        # Start time is kept (perf_counter is the same monotonic clock in all processes)
+        self.start_time = state["start_time"]
+        self.worker_events = []
+
+    def worker_copy(self):
+        profiler = Profiler.__new__(Profiler)
+        profiler.__setstate__(self.__getstate__())
+        return profiler
+
+    def reset_generation(self):
+        self.phase_times = defaultdict(float)
+        self.phase_counts = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.plan_lengths = defaultdict(int)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, start, time.perf_counter())
+
+    def add_time(self, name, start, end, pid=None, tid=None):
+        # Phase measured by caller (perf_counter start and end), by default in current process and thread
+        with self.lock:
+            if self.worker_events is not None:
+                self.worker_events.append((name, start, end, os.getpid(), threading.get_ident()))
+                return
+            self.phase_times[name] += end - start
+            self.phase_counts[name] += 1
+            if self.trace_filename:
+                self.trace_events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.start_time) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": pid or os.getpid(),
+                    "tid": tid or threading.get_ident()
+                })
+
+    def pop_worker_events(self):
+        # Phases timed by worker copy since last call
+        with self.lock:
+            events, self.worker_events = self.worker_events, []
+        return events
+
+    def merge_worker_events(self, events):
+        for event in events:
+            self.add_time(*event)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_solutions(self, action_sequences):
+        # Unsolvable individuals and plan lengths of planned individuals
+        with self.lock:
+            for actions in action_sequences:
+                if actions:
+                    self.plan_lengths[len(actions)] += 1
+                else:
+                    self.counters["unsolvable"] += 1
+
+    def end_generation(self, stats=None):
+        # Close record of current generation (stats of genetic algorithm are added to it)
+        with self.lock:
+            solved = sum(self.plan_lengths.values())
+            record = {
+                "generation": len(self.generations),
+                "phases": {name: {"time": self.phase_times[name], "count": self.phase_counts[name]} for name in self.phase_times},
+                "counters": dict(self.counters),
+                "plan_lengths": {str(length): count for length, count in sorted(self.plan_lengths.items())},
+                "mean_plan_length": sum(length * count for length, count in self.plan_lengths.items()) / solved if solved else 0,
+                "stats": dict(stats or {})
+            }
+            self.generations.append(record)
+            self.reset_generation()
+
+        if self.json_filename:
+            with open(self.json_filename, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        return record
+
+    def pop_generations(self):
+        # Records of generations finished since last call, trace events are dropped with them
+        #  (long-lived users such as quest service keep memory of profiler bounded this way)
+        with self.lock:
+            generations, self.generations = self.generations, []
+            self.trace_events = []
+        return generations
+
+    def totals(self, generations=None):
+        # Phase times and counters summed over all (or given) generations
+        phases = defaultdict(float)
+        counters = defaultdict(int)
+        for record in self.generations if generations is None else generations:
+            for name, phase in record["phases"].items():
+                phases[name] += phase["time"]
+            for name, value in record["counters"].items():
+                counters[name] += value
+        return {"phases": dict(phases), "counters": dict(counters)}
+
+    def export_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({"generations": self.generations, "totals": self.totals()}, f, indent=2)
+
+    def export_chrome_trace(self, filename):
+        # Trace can be opened in chrome://tracing or Perfetto
+        with open(filename, 'w') as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+    def close(self):
+        if self.trace_filename:
+            self.export_chrome_trace(self.trace_filename)
@@ -0,0 +1,231 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PlotGenerator.DomainDatabase.DomainDatabase import DomainDatabase
+from PlotGenerator.QuestGenerator.GeneticAlgorithm import GeneticAlgorithm
+from PlotGenerator.QuestGenerator.PlanCache import PlanCache
+
+
+class QuestService:
+    # Long-lived quest generator serving requests over HTTP
+    #  domain database, planner and plan cache of one genetic algorithm stay warm between requests,
+    #  requests with the same run settings arriving within batch_window seconds are evolved together
+    #  (one population per request, plans shared by all of them) and quests are streamed back as NDJSON
+    def __init__(self, genetic_algorithm, host="127.0.0.1", port=8000, batch_window=0.05, max_batch_size=16):
+        self.ga = genetic_algorithm
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue()
+        # Settings of genetic algorithm change with batches, requests default to the initial ones
+        self.default_settings = {"start_size": self.ga.start_size, "goal_size": self.ga.goal_size, "population_size": self.ga.population_size}
+        self.served_requests = 0
+        self.last_batch = None
+
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.batcher = threading.Thread(target=self.run_batches, daemon=True)
+
+    def handler_class(self):
+        service = self
+
+        class QuestRequestHandler(BaseHTTPRequestHandler):
+            # Chunked responses need HTTP/1.1
+            protocol_version = "HTTP/1.1"
+
+            def send_json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def write_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path != "/stats":
+                    self.send_json(404, {"error": "Not found"})
+                    return
+                self.send_json(200, service.stats())
+
+            def do_POST(self):
+                if self.path != "/quests":
+                    self.send_json(404, {"error": "Not found"})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    request = service.parse_request(body)
+                except KeyError as e:
+                    self.send_json(400, {"error": f"Missing field {e}"})
+                    return
+                except (ValueError, TypeError) as e:
+                    self.send_json(400, {"error": str(e)})
+                    return
+
+                service.requests.put(request)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    while True:
+                        result = request["results"].get()
+                        if result is None:
+                            break
+                        self.write_chunk((json.dumps(result) + "\n").encode())
+                    self.write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client is gone, its remaining quests are not generated
+                    request["cancelled"] = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return QuestRequestHandler
+
+    def parse_request(self, body):
+        # Request: desired_story_arc and optional num_quests, generations, start_size, goal_size and population_size
+        desired_story_arc = [int(tension) for tension in body["desired_story_arc"]]
+        if not desired_story_arc:
+            raise ValueError("desired_story_arc is empty")
+        settings = (
+            int(body.get("generations", 5)),
+            tuple(int(size) for size in body.get("start_size", self.default_settings["start_size"])),
+            tuple(int(size) for size in body.get("goal_size", self.default_settings["goal_size"])),
+            int(body.get("population_size", self.default_settings["population_size"]))
+        )
+        num_quests = int(body.get("num_quests", 1))
+
+        # Settings are checked here, so that invalid requests get a clear error instead of failing in the run
+        generations, start_size, goal_size, population_size = settings
+        if generations < 0:
+            raise ValueError("generations must not be negative")
+        if num_quests < 1:
+            raise ValueError("num_quests must be at least 1")
+        if population_size < 2:
+            raise ValueError("population_size must be at least 2")
+        for name, size in [("start_size", start_size), ("goal_size", goal_size)]:
+            if len(size) != 2 or not 1 <= size[0] < size[1]:
+                raise ValueError(f"{name} must be [min, max] with 1 <= min < max")
+
+        return {
+            "desired_story_arc": desired_story_arc,
+            "num_quests": num_quests,
+            "settings": settings,
+            "results": queue.Queue(),
+            "cancelled": False,
+            "done": 0
+        }
+
+    def next_batch(self):
+        # First waiting request and requests with the same settings arriving within batch window
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.batch_window
+        postponed = []
+        while len(batch) < self.max_batch_size:
+            try:
+                request = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request["settings"] == batch[0]["settings"]:
+                batch.append(request)
+            else:
+                postponed.append(request)
+        for request in postponed:
+            self.requests.put(request)
+        return batch
+
+    def run_batches(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    request["results"].put({"error": str(e)})
+            for request in batch:
+                request["results"].put(None)
+            self.served_requests += len(batch)
+
+    def run_batch(self, batch):
+        generations, start_size, goal_size, population_size = batch[0]["settings"]
+        self.ga.start_size = start_size
+        self.ga.goal_size = goal_size
+        self.ga.population_size = population_size
+
+        try:
+            # Every round generates next quest of all requests which still need one
+            while True:
+                active = [request for request in batch if not request["cancelled"] and request["done"] < request["num_quests"]]
+                if not active:
+                    break
+                quests = self.ga.run_quests_for_arcs(generations, [request["desired_story_arc"] for request in active])
+                for request, (individual, solution) in zip(active, quests):
+                    start, goal = self.ga.dd.individual_to_dicts(individual)
+                    request["results"].put({"quest": request["done"], "start": start, "goal": goal, "plan": solution})
+                    request["done"] += 1
+        finally:
+            self.last_batch = self.batch_stats(batch)
+
+    def batch_stats(self, batch):
+        # Summary of batch, per-generation records are dropped so that memory of the service stays bounded
+        generation_stats = self.ga.pop_generation_stats()
+        stats = {"requests": len(batch), "generations": len(generation_stats)}
+        for name in ["planner_calls", "planner_calls_avoided", "plans_reused", "planner_timeouts", "planner_kills"]:
+            stats[name] = sum(generation.get(name, 0) for generation in generation_stats)
+        if self.ga.profiler is not None:
+            stats["profile"] = self.ga.profiler.totals(self.ga.profiler.pop_generations())
+        return stats
+
+    def stats(self):
+        stats = {
+            "served_requests": self.served_requests,
+            "waiting_requests": self.requests.qsize(),
+            "planner_calls": self.ga.planner_calls,
+            "last_batch": self.last_batch
+        }
+        if self.ga.plan_cache is not None:
+            stats["plan_cache"] = self.ga.plan_cache.stats()
+        return stats
+
+    def serve_forever(self):
+        self.batcher.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.ga.close()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quest generation service")
+    parser.add_argument("--domain", default="PlotGenerator/Domain/World.xml")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--planner", default="hsp", choices=["hsp", "strips"])
+    parser.add_argument("--planner-folder", default="PlotGenerator/Planner")
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument("--executor", default="process", choices=["process", "thread", "async"])
+    parser.add_argument("--plan-cache", help="SQLite file of persistent plan cache")
+    parser.add_argument("--batch-window", type=float, default=0.05)
+    args = parser.parse_args()
+
+    ga = GeneticAlgorithm(
+        DomainDatabase(args.domain),
+        planner=args.planner,
+        planner_folder=args.planner_folder,
+        num_workers=args.num_workers,
+        executor=args.executor,
+        plan_cache=PlanCache(filename=args.plan_cache)
+    )
+    QuestService(ga, args.host, args.port, args.batch_window).serve_forever()
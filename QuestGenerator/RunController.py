@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+
+from PlotGenerator.QuestGenerator.Individual import canonical_key
+
+
+class RunController:
+    # Adaptive budget of one quest run
+    #  stops run when best or mean fitness stalls for patience generations, when target fitness is reached
+    #  or when planner-call or wall-clock (seconds) budget is spent,
+    #  and optionally resizes population (within min/max population size) according to its diversity
+    def __init__(self, patience=None, min_improvement=0.0, monitor="best", target_fitness=None, max_planner_calls=None, max_time=None, min_population_size=None, max_population_size=None, diversity_bounds=(0.3, 0.9), resize_factor=1.5):
+        self.patience = patience
+        self.min_improvement = min_improvement
+        if monitor not in ["best", "mean"]:
+            raise ValueError(f"Unknown monitored fitness: {monitor}")
+        self.monitor = monitor
+        self.target_fitness = target_fitness
+        self.max_planner_calls = max_planner_calls
+        self.max_time = max_time
+        self.min_population_size = min_population_size
+        self.max_population_size = max_population_size
+        # Population grows when ratio of distinct individuals is below lower bound and shrinks above upper bound
+        self.diversity_bounds = diversity_bounds
+        self.resize_factor = resize_factor
+
+        self.start()
+
+    def start(self):
+        # Reset state before each quest run
+        self.start_time = time.monotonic()
+        self.planner_calls = 0
+        self.generation = 0
+        self.best_monitored = -np.inf
+        self.stalled_generations = 0
+        self.stop_reason = None
+        self.history = []
+
+    def config(self):
+        # Settings of controller (part of identity of checkpointed runs)
+        return {
+            "patience": self.patience,
+            "min_improvement": self.min_improvement,
+            "monitor": self.monitor,
+            "target_fitness": self.target_fitness,
+            "max_planner_calls": self.max_planner_calls,
+            "max_time": self.max_time,
+            "min_population_size": self.min_population_size,
+            "max_population_size": self.max_population_size,
+            "diversity_bounds": list(self.diversity_bounds),
+            "resize_factor": self.resize_factor
+        }
+
+    def state(self):
+        # State of current run (saved in checkpoints), elapsed time instead of start time
+        state = {name: value for name, value in self.__dict__.items() if name != "start_time"}
+        state["elapsed_time"] = time.monotonic() - self.start_time
+        return state
+
+    def restore(self, state):
+        state = dict(state)
+        self.start_time = time.monotonic() - state.pop("elapsed_time")
+        self.__dict__.update(state)
+
+    def update(self, evaluated_population, planner_calls):
+        # Record evaluated generation and number of planner calls spent on it
+        self.generation += 1
+        self.planner_calls += planner_calls
+
+        fitness = np.array([evaluated["fitness"] for evaluated in evaluated_population if not evaluated.get("predicted")])
+        best = float(fitness.max()) if len(fitness) else 0.0
+        mean = float(fitness[np.isfinite(fitness)].mean()) if np.isfinite(fitness).any() else best
+        diversity = self.diversity(evaluated_population)
+        self.history.append({"best": best, "mean": mean, "diversity": diversity, "planner_calls": planner_calls})
+
+        monitored = best if self.monitor == "best" else mean
+        if monitored > self.best_monitored + self.min_improvement:
+            self.best_monitored = monitored
+            self.stalled_generations = 0
+        else:
+            self.stalled_generations += 1
+
+        if self.target_fitness is not None and best >= self.target_fitness:
+            self.stop_reason = "target_fitness"
+        elif self.patience is not None and self.stalled_generations >= self.patience:
+            self.stop_reason = "stalled"
+        elif self.max_planner_calls is not None and self.planner_calls >= self.max_planner_calls:
+            self.stop_reason = "planner_calls"
+        elif self.max_time is not None and time.monotonic() - self.start_time >= self.max_time:
+            self.stop_reason = "time"
+
+    def should_stop(self):
+        return self.stop_reason is not None
+
+    def diversity(self, evaluated_population):
+        # Ratio of distinct individuals in population
+        if not evaluated_population:
+            return 0.0
+        return len({canonical_key(evaluated["individual"]) for evaluated in evaluated_population}) / len(evaluated_population)
+
+    def next_population_size(self, population_size):
+        # Population size of next generation according to diversity of last one
+        if not self.history or (self.min_population_size is None and self.max_population_size is None):
+            return population_size
+
+        diversity = self.history[-1]["diversity"]
+        if diversity < self.diversity_bounds[0]:
+            population_size = int(np.ceil(population_size * self.resize_factor))
+        elif diversity > self.diversity_bounds[1]:
+            population_size = int(population_size / self.resize_factor)
+
+        if self.min_population_size is not None:
+            population_size = max(population_size, self.min_population_size)
+        if self.max_population_size is not None:
+            population_size = min(population_size, self.max_population_size)
+        # Crossover needs at least one pair of parents
+        return max(population_size, 2)
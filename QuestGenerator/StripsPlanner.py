@@ -0,0 +1,369 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from PlotGenerator.QuestGenerator.PlannerRunner import PlannerBudgetExceeded
+
+
+class StripsPlanner:
+    # In-process STRIPS planner working on operators and relations of the domain database
+    #  operators are grounded lazily over objects and static facts of each plot (cached by both),
+    #  states are bitsets (python ints) and search is greedy best-first search with FF heuristic
+    def __init__(self, domain_database, max_expansions=100000, timeout=None, max_plan_length=None, max_groundings=1000, inequality=True):
+        self.dd = domain_database
+        # Search budget per problem (expansions and wall-clock seconds), problems over budget stay unsolved
+        # (their plan is PlannerBudgetExceeded, so that it isn't cached)
+        self.max_expansions = max_expansions
+        self.timeout = timeout
+        # States deeper than max plan length are not expanded
+        self.max_plan_length = max_plan_length
+        self.timeouts = 0
+        # Without inequality "!=" preconditions are ignored, as by HSP planner with domain of Planner folder
+        #  (reachability filter and plan reuse must not reject plans HSP can find)
+        self.inequality = inequality
+
+        # Predicates changed by some operator are fluents, other predicates are static
+        self.fluent_predicates = {
+            effect_predicate
+            for operator in self.dd.operators
+            for (effect_predicate, negation, params) in operator["effects"]
+        }
+        self.operators = {operator["name"]: operator for operator in self.dd.operators}
+
+        # Fluent facts, interned when first used by some plot
+        self.fact_ids = {}
+        self.facts = []
+
+        # Ground actions: name, arguments, fluent preconditions, negative preconditions, add and delete effects
+        #  every action is interned once and shared by all plots it is relevant in
+        self.action_names = []
+        self.action_args = []
+        self.action_pre = []
+        self.action_neg_pre = []
+        self.action_add = []
+        self.action_del = []
+        self.action_pre_facts = []
+        self.action_add_facts = []
+        self.action_index = {}  # (name, *arguments) -> action index
+
+        # Relevant actions of recent plots (objects, static facts) -> action indexes
+        self.max_groundings = max_groundings
+        self.groundings = OrderedDict()
+        # Interning can happen from several threads
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def fact_id(self, fact):
+        if fact not in self.fact_ids:
+            self.fact_ids[fact] = len(self.facts)
+            self.facts.append(fact)
+        return self.fact_ids[fact]
+
+    def action_id(self, operator, binding):
+        key = (operator["name"], *binding.values())
+        if key in self.action_index:
+            return self.action_index[key]
+
+        pre, neg_pre, add, delete = 0, 0, 0, 0
+        pre_facts, add_facts = [], []
+        for (predicate, negation, params) in operator["preconditions"]:
+            if predicate not in self.fluent_predicates:
+                continue
+            fact = self.fact_id((predicate, *[binding.get(p, p) for p in params]))
+            if negation:
+                neg_pre |= 1 << fact
+            else:
+                pre |= 1 << fact
+                pre_facts.append(fact)
+
+        for (predicate, negation, params) in operator["effects"]:
+            fact = self.fact_id((predicate, *[binding.get(p, p) for p in params]))
+            if negation:
+                delete |= 1 << fact
+            else:
+                add |= 1 << fact
+                add_facts.append(fact)
+
+        self.action_index[key] = len(self.action_names)
+        self.action_names.append(operator["name"])
+        self.action_args.append(tuple(binding.values()))
+        self.action_pre.append(pre)
+        self.action_neg_pre.append(neg_pre)
+        self.action_add.append(add)
+        self.action_del.append(delete & ~add)
+        self.action_pre_facts.append(pre_facts)
+        self.action_add_facts.append(add_facts)
+        return self.action_index[key]
+
+    def is_static(self, precondition):
+        return precondition[0] == "!=" or precondition[0] not in self.fluent_predicates
+
+    def holds_static(self, precondition, binding, statics):
+        # Static facts hold exactly when they are in start state of the plot
+        predicate, negation, params = precondition
+        values = [binding.get(p, p) for p in params]
+        if predicate == "!=":
+            return values[0] != values[1] or not self.inequality
+        return ((predicate, *values) in statics) != bool(negation)
+
+    def ground_operator(self, operator, objects, statics):
+        # Bind parameters one by one to objects of the plot and prune bindings as soon as a static precondition fails
+        params = list(operator["parameters"].items())
+        param_positions = {name: i for i, (name, type) in enumerate(params)}
+
+        # Static precondition is checked as soon as its last parameter is bound (before binding any if it has none)
+        checks = [[] for _ in range(len(params) + 1)]
+        for precondition in operator["preconditions"]:
+            if self.is_static(precondition):
+                positions = [param_positions[p] + 1 for p in precondition[2] if p in param_positions]
+                checks[max(positions, default=0)].append(precondition)
+
+        def extend(binding, k):
+            if not all(self.holds_static(check, binding, statics) for check in checks[k]):
+                return
+            if k == len(params):
+                yield dict(binding)
+                return
+            name, type = params[k]
+            for value in objects.get(type, []):
+                binding[name] = value
+                yield from extend(binding, k + 1)
+            binding.pop(name, None)
+
+        yield from extend({}, 0)
+
+    def relevant_actions(self, objects, statics):
+        # Actions over objects of the plot whose static preconditions hold in start state
+        key = (objects, statics)
+        with self.lock:
+            if key in self.groundings:
+                self.groundings.move_to_end(key)
+                return self.groundings[key]
+
+            objects_by_type = {}
+            for (type, name) in sorted(objects):
+                objects_by_type.setdefault(type, []).append(name)
+            actions = [
+                self.action_id(operator, binding)
+                for operator in self.dd.operators
+                for binding in self.ground_operator(operator, objects_by_type, statics)
+            ]
+
+            self.groundings[key] = actions
+            while len(self.groundings) > self.max_groundings:
+                self.groundings.popitem(last=False)
+            return actions
+
+    def plot_action(self, action, objects, statics):
+        # Index of ground action (name, *arguments) if it is one of relevant actions of the plot, else None
+        operator = self.operators.get(action[0])
+        if operator is None or len(action) - 1 != len(operator["parameters"]):
+            return None
+        binding = dict(zip(operator["parameters"], action[1:]))
+        if any((type, binding[name]) not in objects for name, type in operator["parameters"].items()):
+            return None
+        if not all(self.holds_static(check, binding, statics) for check in operator["preconditions"] if self.is_static(check)):
+            return None
+        with self.lock:
+            return self.action_id(operator, binding)
+
+    def task(self, individual):
+        # Convert individual to objects, static start facts, start state, goal bitset and goal facts
+        literals = [self.dd.literal_keys[literal] for literal in individual[0]]
+        objects = frozenset((type, name) for (kind, type, name) in literals if kind == "object")
+        init = {(name, *values) for (kind, name, values) in literals if kind == "relation"}
+        statics = frozenset(fact for fact in init if fact[0] not in self.fluent_predicates)
+        goal = {(self.dd.literal_keys[literal][1], *self.dd.literal_keys[literal][2]) for literal in individual[1]}
+
+        with self.lock:
+            state = 0
+            for fact in init:
+                if fact[0] in self.fluent_predicates:
+                    state |= 1 << self.fact_id(fact)
+
+            # Goals no action can change must already hold in start state
+            goal_mask = 0
+            goal_facts = []
+            for fact in goal:
+                if fact[0] in self.fluent_predicates:
+                    goal_mask |= 1 << self.fact_id(fact)
+                    goal_facts.append(self.fact_id(fact))
+                elif fact not in statics:
+                    return None
+
+        return objects, statics, state, goal_mask, goal_facts
+
+    def problem(self, individual):
+        # Start state, goal bitset, goal facts and relevant actions of individual
+        task = self.task(individual)
+        if task is None:
+            return None
+        objects, statics, state, goal_mask, goal_facts = task
+        return state, goal_mask, goal_facts, self.relevant_actions(objects, statics)
+
+    def validate_plan(self, individual, solution):
+        # Simulate plan (lines of planner solution) from start state of individual and check that it reaches goal
+        task = self.task(individual)
+        if task is None:
+            return False
+        objects, statics, state, goal_mask, goal_facts = task
+
+        plan = []
+        for line in solution:
+            line = line.strip()
+            if line.startswith("("):
+                action = tuple(re.sub(r"[()]+", "", line).lower().split())
+                if action:
+                    # Objects and static preconditions of all actions must be in the plot
+                    a = self.plot_action(action, objects, statics)
+                    if a is None:
+                        return False
+                    plan.append(a)
+        if not plan:
+            return False
+
+        for a in plan:
+            if self.action_pre[a] & ~state or self.action_neg_pre[a] & state:
+                return False
+            state = (state & ~self.action_del[a]) | self.action_add[a]
+
+        return not goal_mask & ~state
+
+    def relaxed_layers(self, state, goal_mask, actions):
+        # Delete-relaxed planning graph: facts reachable after each layer of actions
+        #  returns None if goals are unreachable even when delete effects are ignored
+        layers = [state]
+        reached = state
+        remaining = actions
+        while goal_mask & ~reached:
+            new_reached = reached
+            not_applied = []
+            for a in remaining:
+                if self.action_pre[a] & ~reached:
+                    not_applied.append(a)
+                else:
+                    new_reached |= self.action_add[a]
+            if new_reached == reached:
+                return None
+            reached = new_reached
+            remaining = not_applied
+            layers.append(reached)
+        return layers
+
+    def is_goal_reachable(self, individual):
+        # Necessary condition for existence of a plan (ignores delete effects)
+        problem = self.problem(individual)
+        if problem is None:
+            return False
+        state, goal_mask, goal_facts, actions = problem
+        return self.relaxed_layers(state, goal_mask, actions) is not None
+
+    def relaxed_plan_length(self, state, goal_mask, goal_facts, actions, adders):
+        # FF heuristic: build delete-relaxed planning graph and extract relaxed plan
+        layers = self.relaxed_layers(state, goal_mask, actions)
+        if layers is None:
+            return None
+
+        def level(fact):
+            for i, layer in enumerate(layers):
+                if layer >> fact & 1:
+                    return i
+
+        goals_at = [set() for _ in layers]
+        for fact in goal_facts:
+            goals_at[level(fact)].add(fact)
+
+        relaxed_plan = set()
+        achieved = 0
+        for i in range(len(layers) - 1, 0, -1):
+            for fact in goals_at[i]:
+                if achieved >> fact & 1:
+                    continue
+                action = next(a for a in adders[fact] if not self.action_pre[a] & ~layers[i - 1])
+                relaxed_plan.add(action)
+                achieved |= self.action_add[action]
+                for pre_fact in self.action_pre_facts[action]:
+                    pre_level = level(pre_fact)
+                    if pre_level:
+                        goals_at[pre_level].add(pre_fact)
+
+        return len(relaxed_plan)
+
+    def search(self, state, goal_mask, goal_facts, actions):
+        # Greedy best-first search, returns list of action indexes or None
+        adders = {}
+        for a in actions:
+            for fact in self.action_add_facts[a]:
+                adders.setdefault(fact, []).append(a)
+
+        h = self.relaxed_plan_length(state, goal_mask, goal_facts, actions, adders)
+        if h is None:
+            return None
+
+        parents = {state: None}
+        # With plan length limit states are reopened when reached by a shorter path,
+        # so that states deep in the search don't hide plans within the limit
+        depths = {state: 0}
+        counter = itertools.count()
+        queue = [(h, 0, next(counter), state)]
+        expansions = 0
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        while queue and expansions < self.max_expansions:
+            if deadline and time.monotonic() > deadline:
+                self.timeouts += 1
+                return PlannerBudgetExceeded()
+
+            h, g, _, state = heapq.heappop(queue)
+            if g > depths[state]:
+                continue
+            if not goal_mask & ~state:
+                plan = []
+                while parents[state] is not None:
+                    state, action = parents[state]
+                    plan.append(action)
+                return plan[::-1]
+
+            if self.max_plan_length is not None and g >= self.max_plan_length:
+                continue
+
+            expansions += 1
+            for a in actions:
+                if self.action_pre[a] & ~state or self.action_neg_pre[a] & state:
+                    continue
+                successor = (state & ~self.action_del[a]) | self.action_add[a]
+                if successor in parents and (self.max_plan_length is None or depths[successor] <= g + 1):
+                    continue
+                parents[successor] = (state, a)
+                depths[successor] = g + 1
+                successor_h = self.relaxed_plan_length(successor, goal_mask, goal_facts, actions, adders)
+                if successor_h is not None:
+                    heapq.heappush(queue, (successor_h, g + 1, next(counter), successor))
+
+        # Whole (depth limited) search space was explored or expansion budget ran out
+        return PlannerBudgetExceeded() if queue else None
+
+    def solve(self, individual):
+        # Returns plan in the same line format as solutions of HSP planner (empty if no plan was found)
+        problem = self.problem(individual)
+        if problem is None:
+            return []
+
+        plan = self.search(*problem)
+        if plan is None:
+            return []
+        if isinstance(plan, PlannerBudgetExceeded):
+            return plan
+
+        return [f"({' '.join([self.action_names[a], *self.action_args[a]])})\n" for a in plan]
@@ -0,0 +1,75 @@
+import zlib
+
+import numpy as np
+
+
+class SurrogateModel:
+    # Cheap fitness model used to pre-screen offspring before planning
+    #  ridge regression on log(1 + fitness) over hashed features of start and goal literals
+    #  (literal, predicate and object features, separately for start and goal) and sizes of the plot
+    def __init__(self, domain_database, num_features=512, regularization=1.0):
+        self.dd = domain_database
+        self.num_features = num_features
+        self.regularization = regularization
+
+        # Normal equations accumulated over all evaluated individuals
+        self.xtx = np.zeros((num_features + 3, num_features + 3))
+        self.xty = np.zeros(num_features + 3)
+        self.samples = 0
+        self.weights = None
+
+        self.literal_features = [{}, {}]  # start/goal -> literal id -> feature indexes
+
+    @property
+    def trained(self):
+        return self.weights is not None
+
+    def features_of_literal(self, literal, part):
+        # Feature indexes of literal in start (part 0) or goal (part 1)
+        features = self.literal_features[part]
+        if literal not in features:
+            key = self.dd.literal_keys[literal]
+            hashed = [(part, key), (part, key[0], key[1])]
+            if key[0] == "relation":
+                hashed += [(part, "object", value) for value in key[2]]
+            # Stable hash (unlike hash of strings), so that saved model state stays valid in other processes
+            features[literal] = [zlib.crc32(repr(h).encode()) % self.num_features for h in hashed]
+        return features[literal]
+
+    def config(self):
+        # Settings of model (part of identity of checkpointed runs)
+        return {"num_features": self.num_features, "regularization": self.regularization}
+
+    def state(self):
+        # Learned state of model (saved in checkpoints)
+        return {"xtx": self.xtx, "xty": self.xty, "samples": self.samples, "weights": self.weights}
+
+    def restore(self, state):
+        self.__dict__.update(state)
+
+    def features(self, population):
+        x = np.zeros((len(population), self.num_features + 3))
+        for i, individual in enumerate(population):
+            for part in [0, 1]:
+                for literal in individual[part]:
+                    x[i, self.features_of_literal(literal, part)] += 1
+            x[i, -3] = len(individual[0])
+            x[i, -2] = len(individual[1])
+            x[i, -1] = 1
+        return x
+
+    def fit(self, evaluated_population):
+        # Add evaluated individuals to training data and refit model
+        fitness = np.array([evaluated["fitness"] for evaluated in evaluated_population], dtype=float)
+        finite = np.isfinite(fitness)
+        x = self.features([evaluated["individual"] for evaluated, is_finite in zip(evaluated_population, finite) if is_finite])
+        y = np.log1p(fitness[finite])
+
+        self.xtx += x.T @ x
+        self.xty += x.T @ y
+        self.samples += len(y)
+
+        self.weights = np.linalg.solve(self.xtx + self.regularization * np.eye(len(self.xty)), self.xty)
+
+    def predict(self, population):
+        return np.expm1(np.maximum(self.features(population) @ self.weights, 0))